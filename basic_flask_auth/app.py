@@ -1,5 +1,9 @@
 from flask import Flask, request, abort
+import hashlib
 import json
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 from jose import jwt
 from urllib.request import urlopen
@@ -18,6 +22,61 @@ class AuthError(Exception):
         self.status_code = status_code
 
 
+class TokenCache:
+    '''
+    Payloads of tokens that already passed verify_decode_jwt, by the
+    SHA-256 of the token, so a token sent again skips the signature check.
+    An entry is dropped once the token's exp has passed, and the least
+    recently used one is dropped when there are more than max_size.
+    Tokens without an exp claim are never cached.
+
+    hits and misses count lookups, for checking the cache is doing its job
+    '''
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        # token digest -> (exp, payload)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token):
+        digest = hashlib.sha256(token.encode('utf-8')).digest()
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is not None and entry[0] > time.time():
+                self.entries.move_to_end(digest)
+                self.hits += 1
+                return entry[1]
+
+            self.entries.pop(digest, None)
+            self.misses += 1
+            return None
+
+    def set(self, token, payload):
+        exp = payload.get('exp')
+        if not isinstance(exp, (int, float)):
+            return
+
+        digest = hashlib.sha256(token.encode('utf-8')).digest()
+        with self.lock:
+            self.entries[digest] = (exp, payload)
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.entries)
+                }
+
+
+token_cache = TokenCache()
+
 def get_token_auth_header():
     """Obtains the Access Token from the Authorization Header
     """
@@ -116,10 +175,16 @@ def requires_auth(permission=''):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            try:
-                payload = verify_decode_jwt(token)
-            except:
-                abort(401)
+
+            # a token that was verified before is only checked for expiry.
+            # the payload is shared between requests, so don't modify it
+            payload = token_cache.get(token)
+            if payload is None:
+                try:
+                    payload = verify_decode_jwt(token)
+                except:
+                    abort(401)
+                token_cache.set(token, payload)
 
             # doesn't need to return anything. it will abort if permission is
             # not included or not correct
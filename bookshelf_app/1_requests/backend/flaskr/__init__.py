@@ -1,13 +1,19 @@
 import os
-from flask import Flask, request, abort, jsonify
+from flask import Flask, request, abort
 from flask_sqlalchemy import SQLAlchemy  # , or_
 from flask_cors import CORS
 import random
 
-from models import setup_db, Book
+from models import db, setup_db, count_rows, Book
+from query_profiler import QueryProfiler
+from db_pool import PoolMetrics
+from fast_json import json_response, project
 
 BOOKS_PER_SHELF = 8
 
+# the columns of Book.format(), read straight from the result rows
+BOOK_COLUMNS = (Book.id, Book.title, Book.author, Book.rating)
+
 # @TODO: General Instructions
 #   - As you're creating endpoints, define them and then search for 'TODO' within the frontend to update the endpoints there.
 #     If you do not update the endpoints, the lab will not work - of no fault of your API code!
@@ -15,10 +21,34 @@ BOOKS_PER_SHELF = 8
 #   - If you change any of the response body keys, make sure you update the frontend to correspond.
 
 
+def paginate_books(request, selection):
+    # selection is a query ordered by Book.id; only one shelf of it is loaded
+    after = request.args.get("after", None, type=int)
+    if after is not None:
+        # keyset mode: seek past the last book the client has seen
+        selection = selection.filter(Book.id > after)
+    else:
+        page = max(request.args.get("page", 1, type=int), 1)
+        selection = selection.offset((page - 1) * BOOKS_PER_SHELF)
+
+    current_books = project(selection.limit(BOOKS_PER_SHELF), BOOK_COLUMNS)
+
+    return current_books
+
+
+def next_cursor(current_books):
+    # a full shelf may have more books after it, pass this back as ?after=
+    if len(current_books) < BOOKS_PER_SHELF:
+        return None
+    return current_books[-1]["id"]
+
+
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
     setup_db(app)
+    QueryProfiler(app)
+    PoolMetrics(app, db)
     CORS(app)
 
     # CORS Headers
@@ -40,15 +70,15 @@ def create_app(test_config=None):
     # TEST: When completed, the webpage will display books including title, author, and rating shown as stars
     @app.route('/books', methods = ['GET'])
     def retrieve_all_books():
-        books = Book.query.order_by(Book.id).all()
-        formatted_books = [book.format() for book in books]
+        formatted_books = paginate_books(request, Book.query.order_by(Book.id))
 
-        if books is None:
+        if len(formatted_books) == 0:
             abort(404)
         else:
-            return jsonify({"success": True,
-                            "books": formatted_books,
-                            "total_books":len(formatted_books)})
+            return json_response({"success": True,
+                                  "books": formatted_books,
+                                  "next_cursor": next_cursor(formatted_books),
+                                  "total_books": count_rows(Book)})
 
 
     # @TODO: Write a route that will update a single book's rating.
@@ -70,9 +100,9 @@ def create_app(test_config=None):
 
             book.update()
 
-            return jsonify({'success': True,
-                            'id': book_id,
-                            'new_rating': book.rating})
+            return json_response({'success': True,
+                                  'id': book_id,
+                                  'new_rating': book.rating})
         except:
             abort(400)
 
@@ -91,13 +121,13 @@ def create_app(test_config=None):
                 abort(404)
 
             book.delete()
-            books = Book.query.order_by(Book.id).all()
-            formatted_books = [book.format() for book in books]
+            formatted_books = paginate_books(request, Book.query.order_by(Book.id))
 
-            return jsonify({"success": True,
-                            "deleted": book_id,
-                            "books": formatted_books,
-                            "total_books": len(formatted_books)})
+            return json_response({"success": True,
+                                  "deleted": book_id,
+                                  "books": formatted_books,
+                                  "next_cursor": next_cursor(formatted_books),
+                                  "total_books": count_rows(Book)})
 
         except:
             abort(422)
@@ -119,13 +149,13 @@ def create_app(test_config=None):
         try:
             book = Book(title = title, author = author, rating = rating)
             book.insert()
-            books = Book.query.order_by(Book.id).all()
-            formatted_books = [b.format() for b in books]
+            formatted_books = paginate_books(request, Book.query.order_by(Book.id))
 
-            return jsonify({"success": True,
-                            "created": book.id,
-                            "books": formatted_books,
-                            "total_books": len(formatted_books)})
+            return json_response({"success": True,
+                                  "created": book.id,
+                                  "books": formatted_books,
+                                  "next_cursor": next_cursor(formatted_books),
+                                  "total_books": count_rows(Book)})
         except:
             abort(422)
 
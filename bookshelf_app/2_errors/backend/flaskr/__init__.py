@@ -1,28 +1,47 @@
-from flask import Flask, request, abort, jsonify
+from flask import Flask, request, abort
 from flask_sqlalchemy import SQLAlchemy  # , or_
 from flask_cors import CORS
 import random
 
-from models import setup_db, Book
+from models import db, setup_db, count_rows, Book
+from query_profiler import QueryProfiler
+from db_pool import PoolMetrics
+from fast_json import json_response, project
 
 BOOKS_PER_SHELF = 8
 
+# the columns of Book.format(), read straight from the result rows
+BOOK_COLUMNS = (Book.id, Book.title, Book.author, Book.rating)
+
 
 def paginate_books(request, selection):
-    page = request.args.get("page", 1, type=int)
-    start = (page - 1) * BOOKS_PER_SHELF
-    end = start + BOOKS_PER_SHELF
+    # selection is a query ordered by Book.id; only one shelf of it is loaded
+    after = request.args.get("after", None, type=int)
+    if after is not None:
+        # keyset mode: seek past the last book the client has seen
+        selection = selection.filter(Book.id > after)
+    else:
+        page = max(request.args.get("page", 1, type=int), 1)
+        selection = selection.offset((page - 1) * BOOKS_PER_SHELF)
 
-    books = [book.format() for book in selection]
-    current_books = books[start:end]
+    current_books = project(selection.limit(BOOKS_PER_SHELF), BOOK_COLUMNS)
 
     return current_books
 
 
+def next_cursor(current_books):
+    # a full shelf may have more books after it, pass this back as ?after=
+    if len(current_books) < BOOKS_PER_SHELF:
+        return None
+    return current_books[-1]["id"]
+
+
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
     setup_db(app)
+    QueryProfiler(app)
+    PoolMetrics(app, db)
     CORS(app)
 
     # CORS Headers
@@ -38,17 +57,18 @@ def create_app(test_config=None):
 
     @app.route("/books")
     def retrieve_books():
-        selection = Book.query.order_by(Book.id).all()
+        selection = Book.query.order_by(Book.id)
         current_books = paginate_books(request, selection)
 
         if len(current_books) == 0:
             abort(404)
 
-        return jsonify(
+        return json_response(
             {
                 "success": True,
                 "books": current_books,
-                "total_books": len(Book.query.all()),
+                "next_cursor": next_cursor(current_books),
+                "total_books": count_rows(Book),
             }
         )
 
@@ -67,7 +87,7 @@ def create_app(test_config=None):
 
             book.update()
 
-            return jsonify(
+            return json_response(
                 {
                     "success": True,
                 }
@@ -85,15 +105,16 @@ def create_app(test_config=None):
                 abort(404)
 
             book.delete()
-            selection = Book.query.order_by(Book.id).all()
+            selection = Book.query.order_by(Book.id)
             current_books = paginate_books(request, selection)
 
-            return jsonify(
+            return json_response(
                 {
                     "success": True,
                     "deleted": book_id,
                     "books": current_books,
-                    "total_books": len(Book.query.all()),
+                    "next_cursor": next_cursor(current_books),
+                    "total_books": count_rows(Book),
                 }
             )
 
@@ -112,15 +133,16 @@ def create_app(test_config=None):
             book = Book(title=new_title, author=new_author, rating=new_rating)
             book.insert()
 
-            selection = Book.query.order_by(Book.id).all()
+            selection = Book.query.order_by(Book.id)
             current_books = paginate_books(request, selection)
 
-            return jsonify(
+            return json_response(
                 {
                     "success": True,
                     "created": book.id,
                     "books": current_books,
-                    "total_books": len(Book.query.all()),
+                    "next_cursor": next_cursor(current_books),
+                    "total_books": count_rows(Book),
                 }
             )
 
@@ -133,36 +155,36 @@ def create_app(test_config=None):
     # @TODO: Write error handler decorators to handle AT LEAST status codes 400, 404, and 422.
     @app.errorhandler(400)
     def bad_request(error):
-        return jsonify({
+        return json_response({
             "success": False,
             "error": 400,
             "message": "bad request"
-            }), 400
+            }, 400)
 
     @app.errorhandler(404)
     def not_found(error):
-        return jsonify({
+        return json_response({
             "success": False,
             "error": 404,
             "message": "resource not found"
-            }), 404
+            }, 404)
 
     @app.errorhandler(405)
     def method_not_allowed(error):
-        return jsonify({
+        return json_response({
             "success": False,
             "error": 405,
             "message": "method not allowed"
-            }), 405
+            }, 405)
 
 
     @app.errorhandler(422)
     def cannot_process(error):
-        return jsonify({
+        return json_response({
             "success": False,
             "error": 422,
             "message": "cannot process"
-            }), 422
+            }, 422)
 
 
     # TEST: Practice writing curl requests. Write some requests that you know will error in expected ways.
@@ -50,6 +50,28 @@ class BookTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "resource not found")
 
+    def test_get_books_after_cursor(self):
+        first_book = Book.query.order_by(Book.id).first()
+
+        res = self.client().get("/books?after={}".format(first_book.id))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertTrue(len(data["books"]))
+        self.assertTrue(all(book["id"] > first_book.id for book in data["books"]))
+        self.assertIn("next_cursor", data)
+
+    def test_404_sent_requesting_beyond_last_cursor(self):
+        last_book = Book.query.order_by(Book.id.desc()).first()
+
+        res = self.client().get("/books?after={}".format(last_book.id))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "resource not found")
+
     # @TODO: Write tests for search - at minimum two
     #        that check a response when there are results and when there are none
     def test_search_books_not_empty(self):
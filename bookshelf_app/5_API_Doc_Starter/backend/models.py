@@ -1,8 +1,10 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, create_engine, func, text
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from db_pool import engine_options_from_env
+
 database_name = "bookshelf"
 database_path = "postgresql://{}/{}".format("localhost:5432", database_name)
 
@@ -17,11 +19,37 @@ setup_db(app)
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options_from_env(database_path)
     db.app = app
     db.init_app(app)
     db.create_all()
 
 
+"""
+count_rows(model, *criterion)
+    returns the number of rows of model matching criterion with a
+    SELECT count(*) instead of loading every row. unfiltered counts of large
+    PostgreSQL tables come from the planner's estimate in pg_class, which is
+    kept current by autovacuum/ANALYZE, rather than a full table scan
+"""
+APPROXIMATE_COUNT_THRESHOLD = 100000
+
+
+def count_rows(model, *criterion):
+    if not criterion and db.engine.dialect.name == "postgresql":
+        estimate = db.session.execute(
+            text(
+                "SELECT reltuples::bigint FROM pg_class "
+                "WHERE oid = CAST(:table_name AS regclass)"
+            ),
+            {"table_name": model.__tablename__},
+        ).scalar()
+        if estimate is not None and estimate >= APPROXIMATE_COUNT_THRESHOLD:
+            return estimate
+
+    return db.session.query(func.count(model.id)).filter(*criterion).scalar()
+
+
 """
 Book
 
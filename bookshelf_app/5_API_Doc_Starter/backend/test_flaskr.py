@@ -61,6 +61,28 @@ class BookTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "resource not found")
 
+    def test_get_books_after_cursor(self):
+        first_book = Book.query.order_by(Book.id).first()
+
+        res = self.client().get("/books?after={}".format(first_book.id))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertTrue(len(data["books"]))
+        self.assertTrue(all(book["id"] > first_book.id for book in data["books"]))
+        self.assertIn("next_cursor", data)
+
+    def test_404_sent_requesting_beyond_last_cursor(self):
+        last_book = Book.query.order_by(Book.id.desc()).first()
+
+        res = self.client().get("/books?after={}".format(last_book.id))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "resource not found")
+
     def test_get_book_search_with_results(self):
         res = self.client().post("/books", json={"search": "Novel"})
         data = json.loads(res.data)
@@ -3,9 +3,21 @@ from flask import Flask, request, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_migrate import Migrate
-from models import db, setup_db, Movie, Actor
+from models import db, setup_db, Movie, Actor, casting
+from sqlalchemy.orm import joinedload
 import datetime
 from auth import requires_auth, AuthError
+from query_profiler import QueryProfiler
+from db_pool import PoolMetrics
+from exports import export_response
+from bulk import get_batch, bulk_create, bulk_update, bulk_delete
+from listing import list_query
+from fast_json import json_response
+
+# the columns of Actor.format() and Movie.format(), read straight from the
+# result rows. release_date is written as YYYY-MM-DD by fast_json
+ACTOR_COLUMNS = (Actor.id, Actor.name, Actor.age, Actor.gender)
+MOVIE_COLUMNS = (Movie.id, Movie.title, Movie.release_date)
 
 def validate_date_type(date_text):
     """
@@ -20,6 +32,8 @@ def validate_date_type(date_text):
 def create_app(test_config=None):
     app = Flask(__name__)
     setup_db(app)
+    QueryProfiler(app)
+    PoolMetrics(app, db)
     CORS(app)
 
     @app.after_request
@@ -44,19 +58,55 @@ def create_app(test_config=None):
     @app.route('/actors', methods = ["GET"])
     @requires_auth("get:actors")
     def get_all_actors():
-        actors = Actor.query.order_by(Actor.id).all()
+        """
+        Takes the age_gte, age_lt, gender, sort, limit and cursor query
+        parameters, see listing.py
+        """
+        formatted_actors, next_cursor = list_query(Actor, ACTOR_COLUMNS)
 
-        if len(actors) == 0:
+        if len(formatted_actors) == 0:
             abort(404)
 
-        formatted_actors = [actor.format() for actor in actors]
-
-        return jsonify({
+        return json_response({
             "success": True,
             "actors": formatted_actors,
-            "num_actors": len(formatted_actors)
+            "num_actors": len(formatted_actors),
+            "next_cursor": next_cursor
             })
 
+    @app.route('/actors/export', methods = ["GET"])
+    @requires_auth("get:actors")
+    def export_actors():
+        """
+        Streams every actor as NDJSON, or CSV with ?format=csv
+        """
+        return export_response(ACTOR_COLUMNS, "actors")
+
+    @app.route('/actors/bulk', methods = ["POST"])
+    @requires_auth("create:actor")
+    def bulk_create_actors():
+        """
+        Creates every actor in {"actors": [...]} in one transaction
+        """
+        return bulk_create(Actor, get_batch("actors"))
+
+    @app.route('/actors/bulk', methods = ["PATCH"])
+    @requires_auth("update:actor")
+    def bulk_update_actors():
+        """
+        Updates every actor in {"actors": [{"id": ..., ...}]} in one
+        transaction
+        """
+        return bulk_update(Actor, get_batch("actors"))
+
+    @app.route('/actors/bulk', methods = ["DELETE"])
+    @requires_auth("delete:actor")
+    def bulk_delete_actors():
+        """
+        Deletes every actor in {"ids": [...]} with one statement
+        """
+        return bulk_delete(Actor, get_batch("ids"))
+
     @app.route('/actors/<actor_id>', methods = ["GET"])
     @requires_auth("get:actors")
     def get_specific_actor(actor_id):
@@ -161,20 +211,55 @@ def create_app(test_config=None):
     @app.route('/movies', methods = ["GET"])
     @requires_auth("get:movies")
     def get_all_movies():
+        """
+        Takes the release_date_gte, release_date_lt, title, sort, limit and
+        cursor query parameters, see listing.py
+        """
+        formatted_movies, next_cursor = list_query(Movie, MOVIE_COLUMNS)
 
-        movies = Movie.query.order_by(Movie.id).all()
-
-        if len(movies) == 0:
+        if len(formatted_movies) == 0:
             abort(404)
 
-        formatted_movies = [movie.format() for movie in movies]
-
-        return jsonify({
+        return json_response({
             "success": True,
             "movies": formatted_movies,
-            "num_movies": len(formatted_movies)
+            "num_movies": len(formatted_movies),
+            "next_cursor": next_cursor
             })
 
+    @app.route('/movies/export', methods = ["GET"])
+    @requires_auth("get:movies")
+    def export_movies():
+        """
+        Streams every movie as NDJSON, or CSV with ?format=csv
+        """
+        return export_response(MOVIE_COLUMNS, "movies")
+
+    @app.route('/movies/bulk', methods = ["POST"])
+    @requires_auth("create:movie")
+    def bulk_create_movies():
+        """
+        Creates every movie in {"movies": [...]} in one transaction
+        """
+        return bulk_create(Movie, get_batch("movies"))
+
+    @app.route('/movies/bulk', methods = ["PATCH"])
+    @requires_auth("update:movie")
+    def bulk_update_movies():
+        """
+        Updates every movie in {"movies": [{"id": ..., ...}]} in one
+        transaction
+        """
+        return bulk_update(Movie, get_batch("movies"))
+
+    @app.route('/movies/bulk', methods = ["DELETE"])
+    @requires_auth("delete:movie")
+    def bulk_delete_movies():
+        """
+        Deletes every movie in {"ids": [...]} with one statement
+        """
+        return bulk_delete(Movie, get_batch("ids"))
+
     @app.route('/movies/<movie_id>', methods = ["GET"])
     @requires_auth("get:movies")
     def get_specific_movie(movie_id):
@@ -268,6 +353,117 @@ def create_app(test_config=None):
             print(e)
             abort(422)
 
+    ################
+    # casting endpoints
+    ################
+
+    @app.route('/movies/<movie_id>/actors', methods = ["GET"])
+    @requires_auth("get:movies")
+    def get_movie_actors(movie_id):
+        """
+        Returns a movie and its cast, loaded with one query
+        """
+        movie = Movie.query.options(joinedload(Movie.actors)).\
+            filter(Movie.id == movie_id).one_or_none()
+
+        if movie is None:
+            abort(404)
+
+        formatted_actors = [actor.format() for actor in movie.actors]
+
+        return jsonify({
+            "success": True,
+            "movie": movie.format(),
+            "actors": formatted_actors,
+            "num_actors": len(formatted_actors)
+            })
+
+    @app.route('/actors/<actor_id>/movies', methods = ["GET"])
+    @requires_auth("get:actors")
+    def get_actor_movies(actor_id):
+        """
+        Returns an actor and the movies they are cast in, loaded with one
+        query
+        """
+        actor = Actor.query.options(joinedload(Actor.movies)).\
+            filter(Actor.id == actor_id).one_or_none()
+
+        if actor is None:
+            abort(404)
+
+        formatted_movies = [movie.format() for movie in actor.movies]
+
+        return jsonify({
+            "success": True,
+            "actor": actor.format(),
+            "movies": formatted_movies,
+            "num_movies": len(formatted_movies)
+            })
+
+    @app.route('/movies/<movie_id>/actors', methods = ["POST"])
+    @requires_auth("update:movie")
+    def add_movie_actor(movie_id):
+        """
+        Casts {"actor_id": ...} in a movie. Casting an actor twice is a no-op
+        """
+        movie = Movie.query.filter(Movie.id == movie_id).one_or_none()
+
+        if movie is None:
+            abort(404)
+
+        body = request.get_json()
+        actor_id = body.get("actor_id", None)
+
+        if actor_id is None:
+            abort(400)
+
+        if type(actor_id) != int:
+            abort(422)
+
+        actor = Actor.query.filter(Actor.id == actor_id).one_or_none()
+
+        if actor is None:
+            abort(422)
+
+        try:
+            if actor not in movie.actors:
+                movie.actors.append(actor)
+                movie.update()
+            return jsonify({
+                "success": True,
+                "movie_id": movie.id,
+                "actor_id": actor.id
+                })
+        except Exception as e:
+            print(e)
+            db.session.rollback()
+            abort(422)
+
+    @app.route('/movies/<movie_id>/actors/<actor_id>', methods = ["DELETE"])
+    @requires_auth("update:movie")
+    def delete_movie_actor(movie_id, actor_id):
+        """
+        Removes an actor from a movie's cast
+        """
+        try:
+            result = db.session.execute(casting.delete().where(
+                (casting.c.movie_id == movie_id) &
+                (casting.c.actor_id == actor_id)))
+            db.session.commit()
+        except Exception as e:
+            print(e)
+            db.session.rollback()
+            abort(422)
+
+        if result.rowcount == 0:
+            abort(422)
+
+        return jsonify({
+            "success": True,
+            "movie_id": int(movie_id),
+            "deleted": int(actor_id)
+            })
+
     ################
     # error handlers
     ################
@@ -1,4 +1,9 @@
+import hashlib
 import json
+import logging
+import threading
+import time
+from collections import OrderedDict
 from flask import request, _request_ctx_stack, abort
 from functools import wraps
 from jose import jwt
@@ -12,6 +17,9 @@ load_dotenv(override=True)
 AUTH0_DOMAIN = env['AUTH0_DOMAIN']
 ALGORITHMS = [env['ALGORITHMS']]
 API_AUDIENCE = env['API_AUDIENCE']
+JWKS_URL = env.get('JWKS_URL', f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+
+logger = logging.getLogger(__name__)
 
 
 class AuthError(Exception):
@@ -20,6 +28,161 @@ class AuthError(Exception):
         self.status_code = status_code
 
 
+class JWKSCache:
+    '''
+    The public keys of the JSON web key set at url, by kid
+
+    Keys are fetched once and reused for ttl seconds. After that they are
+    still served for up to max_stale seconds while a background thread
+    fetches them again, so requests never wait on Auth0 unless there are no
+    usable keys at all. Only one fetch runs at a time; requests that need
+    keys while one is running wait for it instead of starting another.
+
+    A token signed with a kid that isn't in the set forces a fetch, in case
+    the keys were rotated, but at most once every min_refresh_interval
+    seconds so bad tokens can't be used to hammer the JWKS endpoint.
+    '''
+
+    def __init__(self, url, ttl=600, max_stale=86400, min_refresh_interval=30,
+                 timeout=5):
+        self.url = url
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+
+        self.keys = {}
+        self.fetched_at = None
+        self.forced_at = None
+        # held for the whole time a fetch is running
+        self.fetch_lock = threading.Lock()
+
+    def _fetch(self):
+        with urlopen(self.url, timeout=self.timeout) as response:
+            jwks = json.loads(response.read())
+
+        # swapped in whole, so readers never see a half built set
+        self.keys = {
+            key['kid']: {
+                'kty': key['kty'],
+                'kid': key['kid'],
+                'use': key['use'],
+                'n': key['n'],
+                'e': key['e']
+                }
+            for key in jwks['keys'] if 'kid' in key}
+        self.fetched_at = time.monotonic()
+
+    def refresh(self):
+        '''
+        Fetches the keys, or waits for the fetch that is already running
+        '''
+        if not self.fetch_lock.acquire(blocking=False):
+            with self.fetch_lock:
+                return
+        try:
+            self._fetch()
+        finally:
+            self.fetch_lock.release()
+
+    def _refresh_in_background(self):
+        if not self.fetch_lock.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self._fetch()
+            except Exception:
+                # keep serving the stale keys, the next request tries again
+                logger.exception('refreshing %s failed', self.url)
+            finally:
+                self.fetch_lock.release()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get_key(self, kid):
+        '''
+        Returns the key for kid, or None if the key set doesn't have it
+        '''
+        fetched_at = self.fetched_at
+        age = None if fetched_at is None else time.monotonic() - fetched_at
+
+        expired = age is None or age > self.ttl + self.max_stale
+        if expired:
+            self.refresh()
+        elif age > self.ttl:
+            self._refresh_in_background()
+
+        key = self.keys.get(kid)
+        if key is None and not expired:
+            now = time.monotonic()
+            if self.forced_at is None \
+                    or now - self.forced_at >= self.min_refresh_interval:
+                self.forced_at = now
+                self.refresh()
+                key = self.keys.get(kid)
+
+        return key
+
+
+jwks_cache = JWKSCache(JWKS_URL)
+
+
+class TokenCache:
+    '''
+    Payloads of tokens that already passed verify_decode_jwt, by the
+    SHA-256 of the token, so a token sent again skips the signature check.
+    An entry is dropped once the token's exp has passed, and the least
+    recently used one is dropped when there are more than max_size.
+    Tokens without an exp claim are never cached.
+
+    hits and misses count lookups, for checking the cache is doing its job
+    '''
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        # token digest -> (exp, payload)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token):
+        digest = hashlib.sha256(token.encode('utf-8')).digest()
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is not None and entry[0] > time.time():
+                self.entries.move_to_end(digest)
+                self.hits += 1
+                return entry[1]
+
+            self.entries.pop(digest, None)
+            self.misses += 1
+            return None
+
+    def set(self, token, payload):
+        exp = payload.get('exp')
+        if not isinstance(exp, (int, float)):
+            return
+
+        digest = hashlib.sha256(token.encode('utf-8')).digest()
+        with self.lock:
+            self.entries[digest] = (exp, payload)
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.entries)
+                }
+
+
+token_cache = TokenCache()
+
 def get_token_auth_header():
     auth = request.headers.get("Authorization", None)
 
@@ -96,24 +259,9 @@ def verify_decode_jwt(token):
         }, 401)
 
     # verify the token
-    # get the JSON url for the jwt
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-
-    # get the public JSON web key to verify the signature
-    jwkids = json.loads(jsonurl.read())
-
-    # match kids from private and public keys
-    rsa_key = {}
-    for key in jwkids['keys']:
-        #print(key['kid'])
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-                }
+    # get the public JSON web key matching the kid of the token to verify
+    # the signature. keys are cached instead of fetched on every request
+    rsa_key = jwks_cache.get_key(unverified_header['kid'])
 
     if rsa_key:
         try:
@@ -153,10 +301,16 @@ def requires_auth(permission=''):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            try:
-                payload = verify_decode_jwt(token)
-            except:
-                abort(401)
+
+            # a token that was verified before is only checked for expiry.
+            # the payload is shared between requests, so don't modify it
+            payload = token_cache.get(token)
+            if payload is None:
+                try:
+                    payload = verify_decode_jwt(token)
+                except:
+                    abort(401)
+                token_cache.set(token, payload)
 
             check_permissions(permission, payload)
 
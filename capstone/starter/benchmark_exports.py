@@ -0,0 +1,83 @@
+"""
+Peak memory of GET /actors against GET /actors/export
+
+Seeds the test database with a number of actors, then makes each request
+in a fresh process and prints how much its peak RSS grew while the whole
+response body was read. Like test_app.py it uses TEST_DATABASE_URL, whose
+tables are dropped and recreated.
+
+    python benchmark_exports.py 200000
+"""
+import os
+import resource
+import subprocess
+import sys
+from os import environ as env
+from dotenv import load_dotenv
+
+from app import create_app
+from models import db, setup_db, Actor
+
+load_dotenv()
+
+TEST_DATABASE_URL = env['TEST_DATABASE_URL']
+
+ENDPOINTS = {
+    "list": ("get_all_actors", "/actors"),
+    "export": ("export_actors", "/actors/export")
+}
+
+SEED_BATCH_SIZE = 10000
+
+
+def peak_rss_kb():
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def seed(app, rows):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for start in range(0, rows, SEED_BATCH_SIZE):
+            db.session.execute(Actor.__table__.insert(), [
+                {"name": f"actor {i}", "age": i % 90, "gender": "female"}
+                for i in range(start, min(start + SEED_BATCH_SIZE, rows))])
+        db.session.commit()
+
+
+def measure(app, endpoint):
+    view_name, path = ENDPOINTS[endpoint]
+    # the view without requires_auth, no token is needed
+    view = app.view_functions[view_name].__wrapped__
+
+    with app.test_request_context(path):
+        before = peak_rss_kb()
+        response = view()
+        size = sum(len(chunk) for chunk in response.response)
+        after = peak_rss_kb()
+
+    print(f"{path}: {size / 2 ** 20:.1f} MB body, "
+          f"peak RSS grew {(after - before) / 1024:.1f} MB")
+
+
+def main():
+    app = create_app()
+    setup_db(app, TEST_DATABASE_URL)
+
+    if len(sys.argv) == 3 and sys.argv[1] in ENDPOINTS:
+        measure(app, sys.argv[1])
+        return
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    seed(app, rows)
+    print(f"{rows} actors")
+
+    # a process per request, so one's peak doesn't hide the other's
+    for endpoint in ENDPOINTS:
+        subprocess.run([sys.executable, os.path.abspath(__file__),
+                        endpoint, "measure"], check=True)
+
+
+if __name__ == "__main__":
+    main()
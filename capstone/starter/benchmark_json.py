@@ -0,0 +1,107 @@
+"""
+Serialization time of GET /actors and GET /movies, jsonify against fast_json
+
+For each endpoint the same query is turned into a response two ways:
+
+    jsonify     model objects, their format() dicts and Flask's jsonify,
+                how the endpoints answered before fast_json
+    fast_json   project() rows and json_response(), how they answer now
+
+and the mean time per response is printed, after checking both bodies
+decode to the same JSON. Seeds the database at BENCHMARK_DATABASE_URL,
+whose tables are dropped and recreated:
+
+    export BENCHMARK_DATABASE_URL=postgresql://postgres@localhost:5432/capstone_benchmark
+    python benchmark_json.py 10000
+"""
+import datetime
+import json
+import sys
+import time
+from os import environ as env
+from dotenv import load_dotenv
+from flask import jsonify
+
+import fast_json
+from app import create_app, ACTOR_COLUMNS, MOVIE_COLUMNS
+from fast_json import json_response, project
+from models import db, setup_db, Actor, Movie
+
+load_dotenv()
+
+BENCHMARK_DATABASE_URL = env['BENCHMARK_DATABASE_URL']
+
+# path: (model, columns, key of the list in the response)
+ENDPOINTS = {
+    "/actors": (Actor, ACTOR_COLUMNS, "actors"),
+    "/movies": (Movie, MOVIE_COLUMNS, "movies")
+}
+
+RUNS = 20
+SEED_BATCH_SIZE = 10000
+
+
+def seed(rows):
+    db.drop_all()
+    db.create_all()
+    first_release = datetime.date(1950, 1, 1)
+    for start in range(0, rows, SEED_BATCH_SIZE):
+        batch = range(start, min(start + SEED_BATCH_SIZE, rows))
+        db.session.execute(Actor.__table__.insert(), [
+            {"name": f"actor {i}", "age": i % 90, "gender": "female"}
+            for i in batch])
+        db.session.execute(Movie.__table__.insert(), [
+            {"title": f"movie {i}",
+             "release_date": first_release + datetime.timedelta(days=i % 27000)}
+            for i in batch])
+    db.session.commit()
+
+
+def with_jsonify(model, columns, key):
+    items = [item.format() for item in model.query.order_by(model.id)]
+    return jsonify({"success": True, key: items})
+
+
+def with_fast_json(model, columns, key):
+    items = project(model.query.order_by(model.id), columns)
+    return json_response({"success": True, key: items})
+
+
+def measure(path, respond):
+    model, columns, key = ENDPOINTS[path]
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        response = respond(model, columns, key)
+        body = response.get_data()
+        # objects loaded for format() would otherwise stay in the session
+        db.session.expunge_all()
+    return body, (time.perf_counter() - start) / RUNS
+
+
+def main():
+    app = create_app()
+    setup_db(app, BENCHMARK_DATABASE_URL)
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    with app.app_context():
+        seed(rows)
+
+    encoder = "orjson" if fast_json.orjson is not None else "json"
+    print(f"{rows} actors and {rows} movies, fast_json with {encoder}")
+
+    for path in ENDPOINTS:
+        with app.test_request_context(path):
+            old_body, old_seconds = measure(path, with_jsonify)
+            new_body, new_seconds = measure(path, with_fast_json)
+
+        if json.loads(old_body) != json.loads(new_body):
+            sys.exit(f"{path}: the two bodies differ")
+
+        print(f"{path:<8} jsonify {old_seconds * 1000:8.2f} ms  "
+              f"fast_json {new_seconds * 1000:8.2f} ms  "
+              f"{len(new_body) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
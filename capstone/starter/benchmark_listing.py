@@ -0,0 +1,146 @@
+"""
+Latency of filtered, sorted and cursor pages of GET /actors and GET /movies
+
+Seeds the database at BENCHMARK_DATABASE_URL with a number of actors and
+movies, then times each query in QUERIES, first page and a page from the
+middle of the table through a cursor, with the (field, id) indexes of
+migration 9d4e2a7c81f5 and again after dropping them. Its tables are
+dropped and recreated, so point it at a scratch database:
+
+    export BENCHMARK_DATABASE_URL=postgresql://postgres@localhost:5432/capstone_benchmark
+    python benchmark_listing.py 1000000
+"""
+import datetime
+import sys
+import time
+from os import environ as env
+from urllib.parse import parse_qs, urlsplit
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from app import create_app
+from listing import SORT_FIELDS, encode_cursor
+from models import db, setup_db, Actor, Movie
+
+load_dotenv()
+
+BENCHMARK_DATABASE_URL = env['BENCHMARK_DATABASE_URL']
+
+# view: model it lists
+VIEWS = {
+    "get_all_actors": Actor,
+    "get_all_movies": Movie
+}
+
+QUERIES = [
+    ("get_all_actors", "/actors?age_gte=30&age_lt=40&sort=-age&limit=20"),
+    ("get_all_actors", "/actors?gender=female&sort=name&limit=20"),
+    ("get_all_movies",
+     "/movies?release_date_gte=2020-01-01&sort=release_date&limit=20"),
+    ("get_all_movies", "/movies?sort=-title&limit=20")
+]
+
+# the indexes added by migration 9d4e2a7c81f5
+INDEXES = ["ix_actors_age_id", "ix_actors_gender_id", "ix_actors_name_id",
+           "ix_movies_release_date_id", "ix_movies_title_id"]
+
+GENDERS = ["female", "male", "non-binary"]
+RUNS = 20
+SEED_BATCH_SIZE = 10000
+
+
+def seed(rows):
+    db.drop_all()
+    db.create_all()
+    first_release = datetime.date(1950, 1, 1)
+    for start in range(0, rows, SEED_BATCH_SIZE):
+        batch = range(start, min(start + SEED_BATCH_SIZE, rows))
+        db.session.execute(Actor.__table__.insert(), [
+            {"name": f"actor {i * 7919 % rows}", "age": i % 90,
+             "gender": GENDERS[i % len(GENDERS)]} for i in batch])
+        db.session.execute(Movie.__table__.insert(), [
+            {"title": f"movie {i * 7919 % rows}",
+             "release_date": first_release + datetime.timedelta(days=i % 27000)}
+            for i in batch])
+    db.session.commit()
+    analyze()
+
+
+def analyze():
+    if db.engine.dialect.name == "postgresql":
+        db.session.execute(text("ANALYZE actors"))
+        db.session.execute(text("ANALYZE movies"))
+        db.session.commit()
+
+
+def middle_cursor(view_name, path):
+    """
+    Returns path with a cursor pointing at the middle row of its sort, so
+    the page read is one deep into the table
+    """
+    model = VIEWS[view_name]
+    sort = parse_qs(urlsplit(path).query)["sort"][0]
+    descending = sort.startswith("-")
+    column = SORT_FIELDS[model][sort.lstrip("-")][0]
+
+    if descending:
+        order = [column.desc().nullsfirst(), model.id.desc()]
+    else:
+        order = [column.asc().nullslast(), model.id.asc()]
+
+    count = model.query.count()
+    row = model.query.order_by(*order).offset(count // 2).first()
+    return f"{path}&cursor={encode_cursor(sort, getattr(row, column.key), row.id)}"
+
+
+def measure(app, view_name, path):
+    # the view without requires_auth, no token is needed
+    view = app.view_functions[view_name].__wrapped__
+
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        with app.test_request_context(path):
+            response = view()
+            if response.status_code != 200:
+                sys.exit(f"{path} answered {response.status_code}")
+    return (time.perf_counter() - start) / RUNS
+
+
+def run(app, pages, label):
+    print(label)
+    for view_name, path in pages:
+        print(f"  {measure(app, view_name, path) * 1000:9.2f} ms  {path}")
+
+
+def main():
+    app = create_app()
+    setup_db(app, BENCHMARK_DATABASE_URL)
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    with app.app_context():
+        seed(rows)
+        print(f"{rows} actors and {rows} movies, {db.engine.dialect.name}")
+
+        pages = []
+        for view_name, path in QUERIES:
+            pages.append((view_name, path))
+            pages.append((view_name, middle_cursor(view_name, path)))
+
+        run(app, pages, "with the 9d4e2a7c81f5 indexes")
+
+        indexes = [index for model in VIEWS.values()
+                   for index in model.__table__.indexes
+                   if index.name in INDEXES]
+        for index in indexes:
+            index.drop(bind=db.engine)
+        analyze()
+
+        run(app, pages, "without them")
+
+        for index in indexes:
+            index.create(bind=db.engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Batch create, update and delete for actors and movies
+
+A batch is validated in full before anything is written and then applied
+in a single transaction, so either every record in it succeeds or none
+does. Responses list a result per record, in the order they were sent.
+"""
+import datetime
+from flask import abort, jsonify, request
+from sqlalchemy import insert
+from models import db, Actor, Movie
+
+MAX_BULK_RECORDS = 1000
+
+
+def validate_actor(record, partial=False):
+    """
+    Returns the column values of an actor record, or raises ValueError.
+    partial records, for updates, may leave fields out
+    """
+    values = {}
+    for field, field_type in (("name", str), ("age", int), ("gender", str)):
+        if field not in record:
+            if partial:
+                continue
+            raise ValueError(f"{field} is required")
+        # bool is an int subclass, but not an age
+        if type(record[field]) != field_type:
+            raise ValueError(f"{field} must be a {field_type.__name__}")
+        values[field] = record[field]
+    return values
+
+
+def validate_movie(record, partial=False):
+    """
+    Returns the column values of a movie record, or raises ValueError.
+    partial records, for updates, may leave fields out
+    """
+    values = {}
+    if "title" in record:
+        if type(record["title"]) != str:
+            raise ValueError("title must be a str")
+        values["title"] = record["title"]
+    elif not partial:
+        raise ValueError("title is required")
+
+    if "release_date" in record:
+        try:
+            values["release_date"] = datetime.date.fromisoformat(
+                record["release_date"])
+        except (TypeError, ValueError):
+            raise ValueError("release_date must be a YYYY-MM-DD date")
+    elif not partial:
+        raise ValueError("release_date is required")
+
+    return values
+
+
+VALIDATORS = {
+    Actor: validate_actor,
+    Movie: validate_movie
+}
+
+
+def get_batch(key):
+    """
+    Returns the list under key in the request body. Aborts with 400 if it
+    is missing, empty or longer than MAX_BULK_RECORDS
+    """
+    body = request.get_json(silent=True) or {}
+    batch = body.get(key, None)
+
+    if not isinstance(batch, list) or len(batch) == 0 \
+            or len(batch) > MAX_BULK_RECORDS:
+        abort(400)
+
+    return batch
+
+
+def _failed(results):
+    return jsonify({
+        "success": False,
+        "error": 422,
+        "message": "cannot process",
+        "results": results
+        }), 422
+
+
+def _format_row(model, row):
+    # a transient object, only used to format a returned row
+    values = dict(row._mapping)
+    model_id = values.pop("id")
+    obj = model(**values)
+    obj.id = model_id
+    return obj.format()
+
+
+def bulk_create(model, records):
+    validate = VALIDATORS[model]
+
+    rows = []
+    results = []
+    for index, record in enumerate(records):
+        try:
+            if not isinstance(record, dict):
+                raise ValueError("record must be an object")
+            rows.append(validate(record))
+            results.append({"index": index, "success": True})
+        except ValueError as e:
+            results.append({"index": index, "success": False,
+                            "message": str(e)})
+
+    if not all(result["success"] for result in results):
+        return _failed(results)
+
+    try:
+        if db.engine.dialect.name == "postgresql":
+            # one multi-row INSERT ... VALUES ... RETURNING for the batch.
+            # RETURNING has no guaranteed order, but the serial ids of one
+            # statement follow the VALUES list, so sorting by id lines the
+            # rows up with the records again
+            created = sorted(db.session.execute(
+                insert(model).values(rows).returning(*model.__table__.c)
+                ).all(), key=lambda row: row.id)
+            formatted = [_format_row(model, row) for row in created]
+        else:
+            objects = [model(**row) for row in rows]
+            db.session.add_all(objects)
+            db.session.flush()
+            formatted = [obj.format() for obj in objects]
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        abort(422)
+
+    for result, record in zip(results, formatted):
+        result["id"] = record["id"]
+        result["record"] = record
+
+    return jsonify({
+        "success": True,
+        "created": len(formatted),
+        "results": results
+        })
+
+
+def bulk_update(model, records):
+    validate = VALIDATORS[model]
+
+    mappings = []
+    results = []
+    for index, record in enumerate(records):
+        try:
+            if not isinstance(record, dict) or type(record.get("id")) != int:
+                raise ValueError("id is required")
+            values = validate(record, partial=True)
+            mappings.append(dict(values, id=record["id"]))
+            results.append({"index": index, "success": True,
+                            "id": record["id"]})
+        except ValueError as e:
+            results.append({"index": index, "success": False,
+                            "message": str(e)})
+
+    # one IN lookup for every id in the batch
+    ids = [mapping["id"] for mapping in mappings]
+    found = {row.id for row in
+             db.session.query(model.id).filter(model.id.in_(ids))}
+    for result in results:
+        if result["success"] and result["id"] not in found:
+            result["success"] = False
+            result["message"] = "not found"
+
+    if not all(result["success"] for result in results):
+        return _failed(results)
+
+    try:
+        db.session.bulk_update_mappings(model, mappings)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        abort(422)
+
+    return jsonify({
+        "success": True,
+        "updated": len(mappings),
+        "results": results
+        })
+
+
+def bulk_delete(model, ids):
+    if not all(type(model_id) == int for model_id in ids):
+        abort(400)
+
+    found = {row.id for row in
+             db.session.query(model.id).filter(model.id.in_(ids))}
+    results = [{"index": index, "id": model_id, "success": model_id in found}
+               for index, model_id in enumerate(ids)]
+    for result in results:
+        if not result["success"]:
+            result["message"] = "not found"
+
+    if not all(result["success"] for result in results):
+        return _failed(results)
+
+    try:
+        db.session.query(model).filter(model.id.in_(ids)).\
+            delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        abort(422)
+
+    return jsonify({
+        "success": True,
+        "deleted": len(found),
+        "results": results
+        })
@@ -0,0 +1,93 @@
+"""
+Streaming exports of the actors and movies tables
+
+Rows are read from a server-side cursor EXPORT_BATCH_SIZE at a time and
+written to the response as they arrive, so memory use stays the same
+however large the table is. Only the exported columns are selected; no
+model objects are built.
+"""
+import csv
+import io
+from flask import Response, abort, request, stream_with_context
+from models import db
+from fast_json import dumps
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_MIMETYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+
+def _export_value(value):
+    # dates are written as YYYY-MM-DD, like Movie.format()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def _batches(columns):
+    query = db.session.query(*columns).\
+        order_by(columns[0]).\
+        execution_options(stream_results=True).\
+        yield_per(EXPORT_BATCH_SIZE)
+
+    batch = []
+    for row in query:
+        batch.append([_export_value(value) for value in row])
+        if len(batch) == EXPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate_ndjson(columns):
+    """
+    Yields one JSON object per line, a batch of rows per chunk
+    """
+    names = [column.key for column in columns]
+    for batch in _batches(columns):
+        yield b"".join(dumps(dict(zip(names, row))) + b"\n"
+                       for row in batch)
+
+
+def generate_csv(columns):
+    """
+    Yields a header line and then the rows, a batch of rows per chunk
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow([column.key for column in columns])
+    for batch in _batches(columns):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # the header of an empty table
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_response(columns, name):
+    """
+    Streams columns of every row as ?format=ndjson (the default) or csv
+    """
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in EXPORT_MIMETYPES:
+        abort(400)
+
+    generate = generate_csv if export_format == "csv" else generate_ndjson
+
+    # the request context, and with it the session, stays open until the
+    # last row has been sent
+    return Response(
+        stream_with_context(generate(columns)),
+        mimetype=EXPORT_MIMETYPES[export_format],
+        headers={
+            "Content-Disposition":
+                f"attachment; filename={name}.{export_format}"
+        })
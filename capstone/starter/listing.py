@@ -0,0 +1,186 @@
+"""
+Filtered, sorted and paged lists of actors and movies
+
+GET /actors and GET /movies take query parameters that are turned into
+SQL, so clients don't have to download a whole table to find a few rows:
+
+    /actors?age_gte=20&age_lt=30&gender=female&sort=-age&limit=20
+    /movies?release_date_gte=2020-01-01&sort=release_date&limit=20
+
+sort is a field from SORT_FIELDS, prefixed with - for descending order.
+Rows with the same value are ordered by id. When limit is given the
+response has a next_cursor, which is passed back as ?cursor= to get the
+next page. A page after a cursor starts right after the last row of the
+previous page (keyset paging), so deep pages cost the same as the first
+one. Every filter and sort field has an (field, id) index.
+
+Without any parameters every row is returned, ordered by id.
+"""
+import base64
+import binascii
+import datetime
+import json
+from flask import abort, request
+from sqlalchemy import and_, or_, tuple_
+from models import Actor, Movie
+from fast_json import project
+
+DEFAULT_LIST_LIMIT = 20
+MAX_LIST_LIMIT = 100
+
+
+# query parameters are strings, cursor values are whatever JSON held. a
+# value of the wrong type raises ValueError, so it is a 400 rather than a
+# comparison the database refuses
+
+def _parse_int(value):
+    # int() would cut 5.7 down to 5, and True is an int
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(value)
+    return int(value)
+
+
+def _parse_date(value):
+    if not isinstance(value, str):
+        raise ValueError(value)
+    return datetime.date.fromisoformat(value)
+
+
+def _parse_str(value):
+    if not isinstance(value, str):
+        raise ValueError(value)
+    return value
+
+
+# query parameter: (column, operator, parser)
+FILTERS = {
+    Actor: {
+        "age_gte": (Actor.age, "__ge__", _parse_int),
+        "age_lt": (Actor.age, "__lt__", _parse_int),
+        "gender": (Actor.gender, "__eq__", _parse_str)
+    },
+    Movie: {
+        "release_date_gte": (Movie.release_date, "__ge__", _parse_date),
+        "release_date_lt": (Movie.release_date, "__lt__", _parse_date),
+        "title": (Movie.title, "__eq__", _parse_str)
+    }
+}
+
+# sort field: (column, parser for cursor values)
+SORT_FIELDS = {
+    Actor: {
+        "id": (Actor.id, _parse_int),
+        "name": (Actor.name, _parse_str),
+        "age": (Actor.age, _parse_int)
+    },
+    Movie: {
+        "id": (Movie.id, _parse_int),
+        "title": (Movie.title, _parse_str),
+        "release_date": (Movie.release_date, _parse_date)
+    }
+}
+
+
+def encode_cursor(sort, value, row_id):
+    if isinstance(value, datetime.date):
+        value = value.isoformat()
+    cursor = json.dumps([sort, value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(cursor.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, sort, parse):
+    """
+    Returns the (value, id) of the last row of the previous page. Aborts
+    with 400 if the cursor is malformed or was made for another sort
+    """
+    try:
+        cursor_sort, value, row_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if cursor_sort != sort or type(row_id) != int:
+            raise ValueError
+        if value is not None:
+            value = parse(value)
+    except (binascii.Error, UnicodeError, TypeError, ValueError):
+        abort(400)
+    return value, row_id
+
+
+def _after(column, id_column, descending, value, row_id):
+    """
+    Returns the condition for rows after (value, row_id) in the order
+    column ASC NULLS LAST, id ASC, or the reverse of it if descending.
+    These are PostgreSQL's defaults, so (column, id) indexes are used in
+    both directions
+    """
+    if column is id_column:
+        return id_column < row_id if descending else id_column > row_id
+
+    if descending:
+        if value is None:
+            return or_(column.isnot(None),
+                       and_(column.is_(None), id_column < row_id))
+        return tuple_(column, id_column) < tuple_(value, row_id)
+
+    if value is None:
+        return and_(column.is_(None), id_column > row_id)
+    return or_(tuple_(column, id_column) > tuple_(value, row_id),
+               column.is_(None))
+
+
+def list_query(model, columns):
+    """
+    Returns (rows, next_cursor) for the filter, sort, limit and cursor
+    query parameters, each row a dict of columns. Aborts with 400 on an
+    invalid parameter
+    """
+    query = model.query
+
+    for name, (column, operator, parse) in FILTERS[model].items():
+        if name in request.args:
+            try:
+                value = parse(request.args[name])
+            except ValueError:
+                abort(400)
+            query = query.filter(getattr(column, operator)(value))
+
+    sort = request.args.get("sort", "id")
+    descending = sort.startswith("-")
+    sort_name = sort.lstrip("-")
+    if sort_name not in SORT_FIELDS[model]:
+        abort(400)
+    column, parse = SORT_FIELDS[model][sort_name]
+
+    if descending:
+        order = [column.desc().nullsfirst(), model.id.desc()]
+    else:
+        order = [column.asc().nullslast(), model.id.asc()]
+    if column is model.id:
+        order = order[1:]
+    query = query.order_by(*order)
+
+    cursor = request.args.get("cursor", None)
+    limit = request.args.get("limit", None)
+
+    if limit is None and cursor is None:
+        return project(query, columns), None
+
+    try:
+        limit = min(int(limit or DEFAULT_LIST_LIMIT), MAX_LIST_LIMIT)
+    except ValueError:
+        abort(400)
+    if limit < 1:
+        abort(400)
+
+    if cursor is not None:
+        value, row_id = decode_cursor(cursor, sort, parse)
+        query = query.filter(
+            _after(column, model.id, descending, value, row_id))
+
+    # one extra row tells whether there is a next page
+    rows = project(query.limit(limit + 1), columns)
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(sort, last[column.key], last["id"])
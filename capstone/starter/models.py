@@ -5,6 +5,7 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import date
 import json
 from dotenv import load_dotenv, dotenv_values
+from db_pool import engine_options_from_env
 
 # load environment variables from .env file
 load_dotenv(override=True)
@@ -18,15 +19,40 @@ def setup_db(app, database_path=DATABASE_URL):
     """
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options_from_env(database_path)
     db.app = app
     db.init_app(app)
 
+# table to set the many-to-many relation between Movie and Actor. the
+# primary key (movie_id, actor_id) serves a movie's cast, the index an
+# actor's movies
+casting = db.Table('casting',
+    Column('movie_id', db.Integer,
+           db.ForeignKey('movies.id', ondelete = 'CASCADE'),
+           primary_key = True),
+    Column('actor_id', db.Integer,
+           db.ForeignKey('actors.id', ondelete = 'CASCADE'),
+           primary_key = True),
+    db.Index('ix_casting_actor_id_movie_id', 'actor_id', 'movie_id')
+)
+
 class Movie(db.Model):
     __tablename__ = 'movies'
 
+    __table_args__ = (
+        # filters and sorts of GET /movies, ties ordered by id
+        db.Index('ix_movies_release_date_id', 'release_date', 'id'),
+        db.Index('ix_movies_title_id', 'title', 'id'),
+    )
+
     id = Column(db.Integer, primary_key = True)
     title = Column(db.String)
     release_date = Column(db.Date)
+    # the database removes casting rows when either side is deleted
+    actors = db.relationship('Actor', secondary = casting,
+        order_by = 'Actor.id', passive_deletes = True,
+        backref = db.backref('movies', lazy = True, order_by = 'Movie.id',
+                             passive_deletes = True))
 
     def __init__(self, title, release_date):
         self.title = title
@@ -56,6 +82,12 @@ class Movie(db.Model):
 
 class Actor(db.Model):
     __tablename__ = "actors"
+    __table_args__ = (
+        # filters and sorts of GET /actors, ties ordered by id
+        db.Index('ix_actors_age_id', 'age', 'id'),
+        db.Index('ix_actors_gender_id', 'gender', 'id'),
+        db.Index('ix_actors_name_id', 'name', 'id'),
+    )
 
     id = Column(db.Integer, primary_key = True)
     name = Column(db.String)
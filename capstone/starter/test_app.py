@@ -1,13 +1,19 @@
 
 import os
+import base64
 from os import environ as env
 from dotenv import load_dotenv, dotenv_values
 import unittest
 import json
+import datetime
 from flask_sqlalchemy import SQLAlchemy
 import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 from app import create_app
+from auth import JWKSCache, TokenCache
 from models import db, setup_db, Actor, Movie
 
 load_dotenv()
@@ -99,13 +105,14 @@ class CapstoneTestCase(unittest.TestCase):
     ################
 
     def test_get_all_actors(self):
+        actor = self.actor.format()
         response = self.client().get('/actors',
             headers = self.casting_assistant)
         data = json.loads(response.data)
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(data["success"], True)
-        self.assertEqual(data["actors"], [self.actor.format()])
+        self.assertEqual(data["actors"], [actor])
         self.assertEqual(data["num_actors"], 1)
 
     def test_404_bad_actors_endpoint(self):
@@ -222,13 +229,14 @@ class CapstoneTestCase(unittest.TestCase):
     ################
 
     def test_get_all_movies(self):
+        movie = self.movie.format()
         response = self.client().get('/movies',
             headers = self.casting_assistant)
         data = json.loads(response.data)
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(data["success"], True)
-        self.assertEqual(data["movies"], [self.movie.format()])
+        self.assertEqual(data["movies"], [movie])
         self.assertEqual(data["num_movies"], 1)
 
     def test_404_bad_movies_endpoint(self):
@@ -483,6 +491,483 @@ class CapstoneTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 403)
         self.assertEqual(data["success"], False)
 
+    ################
+    # test list query parameters
+    ################
+
+    def test_get_actors_filtered_and_sorted(self):
+        Actor(name = "tofu", age = 9, gender = "female").insert()
+        Actor(name = "mochi", age = 2, gender = "female").insert()
+        Actor(name = "bean", age = 7, gender = "male").insert()
+
+        response = self.client().get('/actors?age_gte=5&sort=-age',
+            headers = self.casting_assistant)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([actor["name"] for actor in data["actors"]],
+                         ["tofu", "bean", "miso"])
+        self.assertEqual(data["next_cursor"], None)
+
+        response = self.client().get('/actors?gender=female&age_lt=5',
+            headers = self.casting_assistant)
+        data = json.loads(response.data)
+
+        self.assertEqual([actor["name"] for actor in data["actors"]],
+                         ["mochi"])
+
+    def test_get_actors_cursor_pages(self):
+        for age in [5, 5, 6]:
+            Actor(name = "tofu", age = age, gender = "female").insert()
+
+        ids = []
+        cursor = None
+        while True:
+            path = '/actors?sort=age&limit=2'
+            if cursor is not None:
+                path += f'&cursor={cursor}'
+            response = self.client().get(path,
+                headers = self.casting_assistant)
+            data = json.loads(response.data)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(data["num_actors"], 2)
+            ids += [actor["id"] for actor in data["actors"]]
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+
+        self.assertEqual(ids, [1, 2, 3, 4])
+
+    def test_400_get_actors_bad_sort(self):
+        response = self.client().get('/actors?sort=-secret',
+            headers = self.casting_assistant)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data["success"], False)
+
+    def test_400_get_actors_cursor_for_other_sort(self):
+        Actor(name = "tofu", age = 9, gender = "female").insert()
+
+        response = self.client().get('/actors?sort=age&limit=1',
+            headers = self.casting_assistant)
+        cursor = json.loads(response.data)["next_cursor"]
+        response = self.client().get(f'/actors?sort=name&cursor={cursor}',
+            headers = self.casting_assistant)
+
+        self.assertEqual(response.status_code, 400)
+
+    def forged_cursor(self, sort, value, row_id):
+        cursor = json.dumps([sort, value, row_id])
+        return base64.urlsafe_b64encode(cursor.encode("utf-8")).decode("ascii")
+
+    def test_400_get_actors_forged_cursor_wrong_type(self):
+        Actor(name = "tofu", age = 9, gender = "female").insert()
+
+        for sort, value in [("name", 123), ("age", 5.7), ("age", "5.7"),
+                            ("age", True), ("name", ["tofu"])]:
+            cursor = self.forged_cursor(sort, value, 1)
+            response = self.client().get(
+                f'/actors?sort={sort}&cursor={cursor}',
+                headers = self.casting_assistant)
+            data = json.loads(response.data)
+
+            self.assertEqual(response.status_code, 400, (sort, value))
+            self.assertEqual(data["success"], False)
+
+    def test_400_get_movies_forged_cursor_wrong_type(self):
+        for sort, value in [("release_date", 20230101), ("title", 1)]:
+            cursor = self.forged_cursor(sort, value, 1)
+            response = self.client().get(
+                f'/movies?sort={sort}&cursor={cursor}',
+                headers = self.casting_assistant)
+
+            self.assertEqual(response.status_code, 400, (sort, value))
+
+    def test_get_movies_release_date_window(self):
+        Movie(title = "old cat",
+              release_date = datetime.date(1999, 1, 1)).insert()
+        Movie(title = "new cat",
+              release_date = datetime.date(2023, 1, 1)).insert()
+
+        response = self.client().get(
+            '/movies?release_date_gte=2000-01-01&release_date_lt=2023-01-01',
+            headers = self.casting_assistant)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([movie["title"] for movie in data["movies"]],
+                         ["good cat"])
+
+    def test_404_get_movies_no_match(self):
+        response = self.client().get('/movies?release_date_lt=1900-01-01',
+            headers = self.casting_assistant)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data["success"], False)
+
+    ################
+    # test casting endpoints
+    ################
+
+    def test_add_movie_actor(self):
+        response = self.client().post('/movies/1/actors',
+            json = {"actor_id": 1},
+            headers = self.casting_director)
+        data = json.loads(response.data)
+        movie = Movie.query.get(1)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertEqual([actor.id for actor in movie.actors], [1])
+        self.db.session.close()
+
+    def test_422_cannot_add_movie_actor_bad_actor_id(self):
+        response = self.client().post('/movies/1/actors',
+            json = {"actor_id": 1000},
+            headers = self.casting_director)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data["success"], False)
+
+    def test_get_movie_actors(self):
+        self.client().post('/movies/1/actors',
+            json = {"actor_id": 1},
+            headers = self.casting_director)
+        response = self.client().get('/movies/1/actors',
+            headers = self.casting_assistant)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(data["movie"]["title"], "good cat")
+        self.assertEqual([actor["name"] for actor in data["actors"]],
+                         ["miso"])
+        self.assertEqual(data["num_actors"], 1)
+
+    def test_404_cannot_get_movie_actors_bad_id(self):
+        response = self.client().get('/movies/1000/actors',
+            headers = self.casting_assistant)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data["success"], False)
+
+    def test_get_actor_movies(self):
+        self.client().post('/movies/1/actors',
+            json = {"actor_id": 1},
+            headers = self.casting_director)
+        response = self.client().get('/actors/1/movies',
+            headers = self.casting_assistant)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(data["actor"]["name"], "miso")
+        self.assertEqual([movie["title"] for movie in data["movies"]],
+                         ["good cat"])
+        self.assertEqual(data["num_movies"], 1)
+
+    def test_delete_movie_actor(self):
+        self.client().post('/movies/1/actors',
+            json = {"actor_id": 1},
+            headers = self.casting_director)
+        response = self.client().delete('/movies/1/actors/1',
+            headers = self.casting_director)
+        data = json.loads(response.data)
+        movie = Movie.query.get(1)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(movie.actors, [])
+        self.db.session.close()
+
+    def test_422_cannot_delete_movie_actor_not_cast(self):
+        response = self.client().delete('/movies/1/actors/1',
+            headers = self.casting_director)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data["success"], False)
+
+    def test_403_cannot_add_movie_actor(self):
+        response = self.client().post('/movies/1/actors',
+            json = {"actor_id": 1},
+            headers = self.casting_assistant)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(data["success"], False)
+
+    ################
+    # test bulk endpoints
+    ################
+
+    def test_bulk_create_actors(self):
+        response = self.client().post('/actors/bulk',
+            json = {"actors": [self.new_actor,
+                               dict(self.new_actor, name = "tofu")]},
+            headers = self.executive_producer)
+        data = json.loads(response.data)
+        names = [actor.name for actor in Actor.query.order_by(Actor.id)]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(data["created"], 2)
+        self.assertEqual([result["record"]["name"] for result in
+                          data["results"]], ["mister", "tofu"])
+        self.assertEqual(names, ["miso", "mister", "tofu"])
+        self.db.session.close()
+
+    def test_422_bulk_create_actors_writes_nothing(self):
+        response = self.client().post('/actors/bulk',
+            json = {"actors": [self.new_actor,
+                               dict(self.new_actor, age = "three")]},
+            headers = self.executive_producer)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data["success"], False)
+        self.assertEqual([result["success"] for result in data["results"]],
+                         [True, False])
+        self.assertEqual(Actor.query.count(), 1)
+        self.db.session.close()
+
+    def test_400_bulk_create_movies_too_many(self):
+        response = self.client().post('/movies/bulk',
+            json = {"movies": [self.new_movie] * 1001},
+            headers = self.executive_producer)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(Movie.query.count(), 1)
+        self.db.session.close()
+
+    def test_bulk_update_movies(self):
+        response = self.client().patch('/movies/bulk',
+            json = {"movies": [{"id": 1, "title": "great cat"}]},
+            headers = self.executive_producer)
+        data = json.loads(response.data)
+        movie = Movie.query.get(1)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(data["updated"], 1)
+        self.assertEqual(movie.format()["title"], "great cat")
+        self.assertEqual(movie.format()["release_date"], "2018-08-09")
+        self.db.session.close()
+
+    def test_422_bulk_update_actors_bad_id(self):
+        response = self.client().patch('/actors/bulk',
+            json = {"actors": [{"id": 1000, "age": 6}]},
+            headers = self.executive_producer)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["results"][0]["message"], "not found")
+
+    def test_bulk_delete_actors(self):
+        response = self.client().delete('/actors/bulk',
+            json = {"ids": [1]},
+            headers = self.executive_producer)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(data["deleted"], 1)
+        self.assertEqual(Actor.query.count(), 0)
+        self.db.session.close()
+
+    def test_422_bulk_delete_movies_bad_id(self):
+        response = self.client().delete('/movies/bulk',
+            json = {"ids": [1, 1000]},
+            headers = self.executive_producer)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(Movie.query.count(), 1)
+        self.db.session.close()
+
+    def test_403_bulk_create_actors(self):
+        response = self.client().post('/actors/bulk',
+            json = {"actors": [self.new_actor]},
+            headers = self.casting_assistant)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(data["success"], False)
+
+    ################
+    # test export endpoints
+    ################
+
+    def test_export_actors_ndjson(self):
+        actor = self.actor.format()
+        response = self.client().get('/actors/export',
+            headers = self.casting_assistant)
+        lines = response.data.decode("utf-8").splitlines()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual([json.loads(line) for line in lines],
+                         [actor])
+
+    def test_export_movies_csv(self):
+        response = self.client().get('/movies/export?format=csv',
+            headers = self.casting_assistant)
+        lines = response.data.decode("utf-8").splitlines()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/csv")
+        self.assertEqual(lines, ["id,title,release_date",
+                                 "1,good cat,2018-08-09"])
+
+    def test_400_export_unknown_format(self):
+        response = self.client().get('/actors/export?format=xml',
+            headers = self.casting_assistant)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data["success"], False)
+
+    ################
+    # test /metrics endpoint
+    ################
+
+    def test_get_pool_metrics(self):
+        self.app.config["POOL_METRICS_ENABLED"] = True
+        self.client().get('/actors', headers = self.casting_assistant)
+        response = self.client().get('/metrics')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertIn("pool", data["database_pool"])
+
+    def test_404_pool_metrics_disabled(self):
+        self.app.config["POOL_METRICS_ENABLED"] = False
+        response = self.client().get('/metrics')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data["success"], False)
+
+
+class JWKSHandler(BaseHTTPRequestHandler):
+    """
+    Serves the JSON web key set of the test server and counts the requests
+    """
+    def do_GET(self):
+        self.server.requests += 1
+        # slow enough for concurrent requests to overlap
+        time.sleep(0.1)
+
+        body = json.dumps(self.server.jwks).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class JWKSCacheTestCase(unittest.TestCase):
+    """
+    This class represents the JWKS cache test case, run against a local
+    stand-in for the Auth0 JWKS endpoint
+    """
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), JWKSHandler)
+        self.server.requests = 0
+        self.server.jwks = {"keys": [self.jwk("first")]}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.url = f"http://127.0.0.1:{self.server.server_port}/jwks.json"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def jwk(self, kid):
+        return {"kid": kid, "kty": "RSA", "use": "sig", "n": "n", "e": "AQAB"}
+
+    def test_concurrent_requests_fetch_once(self):
+        cache = JWKSCache(self.url)
+        keys = []
+        threads = [threading.Thread(target=lambda: keys.append(
+            cache.get_key("first"))) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual([key["kid"] for key in keys], ["first"] * 10)
+
+    def test_unknown_kid_forces_one_refresh(self):
+        cache = JWKSCache(self.url, min_refresh_interval=60)
+        cache.get_key("first")
+        self.server.jwks = {"keys": [self.jwk("first"), self.jwk("second")]}
+
+        self.assertEqual(cache.get_key("second")["kid"], "second")
+        self.assertEqual(cache.get_key("unknown"), None)
+        self.assertEqual(cache.get_key("unknown"), None)
+        self.assertEqual(self.server.requests, 2)
+
+    def test_stale_keys_served_while_refreshing(self):
+        cache = JWKSCache(self.url, ttl=0)
+        cache.get_key("first")
+        self.server.jwks = {"keys": [self.jwk("second")]}
+
+        # the stale set is returned at once and replaced in the background
+        self.assertEqual(cache.get_key("first")["kid"], "first")
+        time.sleep(0.5)
+        self.assertEqual(cache.get_key("second")["kid"], "second")
+
+
+class TokenCacheTestCase(unittest.TestCase):
+    """
+    This class represents the verified token cache test case
+    """
+
+    def test_cached_payload_returned(self):
+        cache = TokenCache()
+        payload = {"sub": "miso", "exp": time.time() + 60}
+        cache.set("token", payload)
+
+        self.assertEqual(cache.get("token"), payload)
+        self.assertEqual(cache.get("other token"), None)
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "size": 1})
+
+    def test_expired_payload_not_returned(self):
+        cache = TokenCache()
+        cache.set("token", {"sub": "miso", "exp": time.time() - 1})
+        cache.set("no exp", {"sub": "miso"})
+
+        self.assertEqual(cache.get("token"), None)
+        self.assertEqual(cache.get("no exp"), None)
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_least_recently_used_dropped(self):
+        cache = TokenCache(max_size=2)
+        exp = time.time() + 60
+        cache.set("first", {"exp": exp})
+        cache.set("second", {"exp": exp})
+        cache.get("first")
+        cache.set("third", {"exp": exp})
+
+        self.assertEqual(cache.get("second"), None)
+        self.assertTrue(cache.get("first"))
+        self.assertTrue(cache.get("third"))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,74 @@
+'''
+Verifications per second of an RS256 token, with the JWK dict that
+verify_decode_jwt used to build per request against the parsed Key that
+KeyRegistry keeps
+
+    cd backend
+    python benchmark_verify.py 3000
+
+The signing key is generated with the rsa package, which python-jose
+depends on. The output names the jose RSA backend in use; it is the
+cryptography package's when that is installed, and the much slower pure
+python rsa package's otherwise.
+'''
+import base64
+import sys
+import time
+
+import rsa
+from jose import jwk, jwt
+from jose.backends import RSAKey
+
+from src.auth.auth import KeyRegistry, ALGORITHMS, API_AUDIENCE, AUTH0_DOMAIN
+
+
+def b64_int(value):
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def rate(verify, token, key, runs):
+    verify(token, key)
+    start = time.perf_counter()
+    for _ in range(runs):
+        verify(token, key)
+    return runs / (time.perf_counter() - start)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+
+    public_key, private_key = rsa.newkeys(2048)
+    jwk_dict = {
+        'kty': 'RSA',
+        'kid': 'benchmark',
+        'use': 'sig',
+        'n': b64_int(public_key.n),
+        'e': b64_int(public_key.e)
+        }
+    token = jwt.encode({
+        'iss': 'https://' + AUTH0_DOMAIN + '/',
+        'aud': API_AUDIENCE,
+        'exp': int(time.time()) + 3600,
+        'permissions': ['get:drinks-detail']
+        }, private_key.save_pkcs1().decode('ascii'), algorithm=ALGORITHMS[0],
+        headers={'kid': 'benchmark'})
+
+    # no fetch, the key set is filled in by hand
+    registry = KeyRegistry('http://localhost/unused')
+    key = jwk.construct(jwk_dict, ALGORITHMS[0])
+
+    def decode_dict(token, key):
+        return jwt.decode(token, key, algorithms=ALGORITHMS,
+                          audience=API_AUDIENCE,
+                          issuer='https://' + AUTH0_DOMAIN + '/')
+
+    print(f'jose RSA backend: {RSAKey.__module__}.{RSAKey.__name__}')
+    print(f'JWK dict:  {rate(decode_dict, token, jwk_dict, runs):,.0f} '
+          f'verifications/s')
+    print(f'Key object: {rate(registry.verify, token, key, runs):,.0f} '
+          f'verifications/s')
+
+
+if __name__ == '__main__':
+    main()
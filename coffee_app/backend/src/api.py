@@ -4,12 +4,19 @@ from sqlalchemy import exc
 import json
 from flask_cors import CORS
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import db_drop_and_create_all, setup_db, db, Drink
 from .auth.auth import AuthError, requires_auth
+from .query_profiler import QueryProfiler
+from .db_pool import PoolMetrics
+from .menu_snapshot import menu_snapshot
+
+MAX_BULK_DRINKS = 100
 
 app = Flask(__name__)
 setup_db(app)
 CORS(app)
+QueryProfiler(app)
+PoolMetrics(app, db)
 
 '''
 @TODO uncomment the following line to initialize the datbase
@@ -19,6 +26,30 @@ CORS(app)
 '''
 db_drop_and_create_all()
 
+'''
+validated_recipe(recipe)
+    returns recipe as a list of ingredients, a single ingredient can be sent
+    on its own. aborts with 400 unless every ingredient has the shape
+    {'color': string, 'name': string, 'parts': number}, anything else would
+    break Drink.short() and with it GET /drinks
+'''
+def validated_recipe(recipe):
+    if isinstance(recipe, dict):
+        recipe = [recipe]
+
+    if not isinstance(recipe, list) or len(recipe) == 0:
+        abort(400)
+
+    for ingredient in recipe:
+        if not isinstance(ingredient, dict) \
+                or not isinstance(ingredient.get('name'), str) \
+                or not isinstance(ingredient.get('color'), str) \
+                or type(ingredient.get('parts')) not in (int, float):
+            abort(400)
+
+    return recipe
+
+
 ######################
 # ROUTES
 ######################
@@ -32,14 +63,8 @@ db_drop_and_create_all()
 '''
 @app.route("/drinks", methods=["GET"])
 def get_drinks():
-    # obtain and format drinks
-    drinks = Drink.query.order_by(Drink.id).all()
-    formatted_drinks = [drink.short() for drink in drinks]
-
-    return jsonify({
-        "success": True,
-        "drinks": formatted_drinks
-        }), 200
+    # the menu is serialized once per change, not on every request
+    return menu_snapshot.get().short.response()
 
 
 '''
@@ -53,14 +78,8 @@ def get_drinks():
 @app.route("/drinks-detail", methods=["GET"])
 @requires_auth("get:drinks-detail")
 def get_drink_detail():
-    # obtain and format drinks
-    drinks = Drink.query.order_by(Drink.id).all()
-    formatted_drinks = [drink.long() for drink in drinks]
-
-    return jsonify({
-        "success": True,
-        "drinks": formatted_drinks
-        }), 200
+    # the menu is serialized once per change, not on every request
+    return menu_snapshot.get().long.response()
 
 
 '''
@@ -75,33 +94,79 @@ def get_drink_detail():
 @app.route("/drinks", methods=["POST"])
 @requires_auth("post:drinks")
 def post_drink():
-    drink_data = request.get_json()
+    drink_data = request.get_json(silent=True) or {}
     title = drink_data.get("title", None)
-    recipe = drink_data.get("recipe", None)
 
     # can't be empty
-    if title is None or recipe is None:
+    if not isinstance(title, str):
+        abort(400)
+
+    recipe = validated_recipe(drink_data.get("recipe", None))
+
+    # titles are unique=True, so the database rejects duplicates through
+    # its index instead of every title being loaded to check first
+    new_drink = Drink(title=title, recipe=recipe)
+    try:
+        new_drink.insert()
+    except exc.IntegrityError:
+        db.session.rollback()
         abort(400)
 
-    # uniqueness of titles
-    all_titles = [drink.title for drink in Drink.query.all()]
-    if title in all_titles:
+    return jsonify({
+        "success": True,
+        "drinks": [new_drink.long()]
+        }), 200
+
+
+'''
+    POST /drinks/bulk
+        it should create every drink in {"drinks": [{"title": ..., "recipe": ...}]}
+        it should require the 'post:drinks' permission
+        it should create all of the drinks or none of them
+    returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of created drinks
+        or 400 if a drink is missing a title or recipe, a recipe ingredient isn't
+        {'color': string, 'name': string, 'parts': number}, a title is repeated or
+        already taken, or more than MAX_BULK_DRINKS drinks are sent
+'''
+@app.route("/drinks/bulk", methods=["POST"])
+@requires_auth("post:drinks")
+def post_drinks_bulk():
+    drinks_data = (request.get_json(silent=True) or {}).get("drinks", None)
+
+    if not isinstance(drinks_data, list) or len(drinks_data) == 0 \
+            or len(drinks_data) > MAX_BULK_DRINKS:
         abort(400)
 
-    # format the recipe correctly
-    recipe = json.dumps(recipe)
-    if recipe[0] != "[":
-        recipe = f"[{recipe}"
-    if recipe[-1] != "]":
-        recipe = f"{recipe}]"
+    # validate the whole batch before writing any of it
+    new_drinks = []
+    titles = set()
+    for drink_data in drinks_data:
+        if not isinstance(drink_data, dict):
+            abort(400)
 
+        title = drink_data.get("title", None)
+        if not isinstance(title, str) or title in titles:
+            abort(400)
+        titles.add(title)
 
-    new_drink = Drink(title=title, recipe=recipe)
-    new_drink.insert()
+        recipe = validated_recipe(drink_data.get("recipe", None))
+        new_drinks.append(Drink(title=title, recipe=recipe))
+
+    # one index lookup for every title already taken
+    if Drink.query.filter(Drink.title.in_(titles)).first() is not None:
+        abort(400)
+
+    try:
+        db.session.add_all(new_drinks)
+        db.session.commit()
+    except exc.IntegrityError:
+        # a drink with one of the titles was created since the check
+        db.session.rollback()
+        abort(400)
 
     return jsonify({
         "success": True,
-        "drinks": [new_drink.long()]
+        "drinks": [drink.long() for drink in new_drinks]
         }), 200
 
 
@@ -124,18 +189,15 @@ def update_drink(drink_id):
     if drink is None:
         abort(404)
 
-    update_data = request.get_json()
+    update_data = request.get_json(silent=True) or {}
 
     if "title" in update_data:
+        if not isinstance(update_data["title"], str):
+            abort(400)
         drink.title = update_data["title"]
 
     if "recipe" in update_data:
-        recipe = json.dumps(update_data["recipe"])
-        if recipe[0] != "[":
-            recipe = f"[{recipe}"
-        if recipe[-1] != "]":
-            recipe = f"{recipe}]"
-        drink.recipe = recipe
+        drink.recipe = validated_recipe(update_data["recipe"])
 
     drink.update()
 
@@ -1,7 +1,12 @@
+import hashlib
 import json
+import logging
+import threading
+import time
+from collections import OrderedDict
 from flask import request, _request_ctx_stack, abort
 from functools import wraps
-from jose import jwt
+from jose import jwk, jwt
 from urllib.request import urlopen
 
 # @TODO set these with .env
@@ -9,6 +14,8 @@ AUTH0_DOMAIN = 'ilovemiso.us.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'coffee'
 
+logger = logging.getLogger(__name__)
+
 ## AuthError Exception
 '''
 AuthError Exception
@@ -20,6 +27,197 @@ class AuthError(Exception):
         self.status_code = status_code
 
 
+## Key Registry
+
+'''
+KeyRegistry
+Public keys of the Auth0 JSON web key set by kid, parsed into jose Key
+objects once when the set is fetched. jwt.decode re-parses a JWK dict on
+every call; handing it a Key skips that and roughly doubles the number of
+tokens verified per second (see benchmark_verify.py).
+
+Refreshing follows capstone's JWKSCache. Keys are reused for ttl seconds,
+so a revoked key stops being trusted once that has passed. After that
+they are still served for up to max_stale seconds while a background
+thread fetches the set again, so requests never wait on Auth0 unless there
+are no usable keys at all. Only one fetch runs at a time. An unknown kid
+forces a fetch, in case the keys were rotated, at most once every
+min_refresh_interval seconds.
+
+Keys are immutable after construction and the dict is replaced whole on
+refresh, so all threads share them without locking.
+'''
+class KeyRegistry:
+    def __init__(self, url, ttl=600, max_stale=86400, min_refresh_interval=30,
+                 timeout=5):
+        self.url = url
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+
+        self.keys = {}
+        self.fetched_at = None
+        self.forced_at = None
+        # held for the whole time a fetch is running
+        self.fetch_lock = threading.Lock()
+
+        # decode with everything but the token and key already bound
+        self.claims = {
+            'algorithms': ALGORITHMS,
+            'audience': API_AUDIENCE,
+            'issuer': 'https://' + AUTH0_DOMAIN + '/'
+            }
+
+    def _fetch(self):
+        with urlopen(self.url, timeout=self.timeout) as response:
+            jwks = json.loads(response.read())
+
+        self.keys = {
+            key['kid']: jwk.construct(key, ALGORITHMS[0])
+            for key in jwks['keys'] if key.get('kty') == 'RSA'}
+        self.fetched_at = time.monotonic()
+
+    def refresh(self):
+        '''
+        Fetches the keys, or waits for the fetch that is already running
+        '''
+        if not self.fetch_lock.acquire(blocking=False):
+            with self.fetch_lock:
+                return
+        try:
+            self._fetch()
+        finally:
+            self.fetch_lock.release()
+
+    def _refresh_in_background(self):
+        if not self.fetch_lock.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self._fetch()
+            except Exception:
+                # keep serving the stale keys, the next request tries again
+                logger.exception('refreshing %s failed', self.url)
+            finally:
+                self.fetch_lock.release()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get(self, kid):
+        '''
+        Returns the Key for kid, or None if the key set doesn't have it
+        '''
+        fetched_at = self.fetched_at
+        age = None if fetched_at is None else time.monotonic() - fetched_at
+
+        expired = age is None or age > self.ttl + self.max_stale
+        if expired:
+            self.refresh()
+        elif age > self.ttl:
+            self._refresh_in_background()
+
+        key = self.keys.get(kid)
+        if key is None and not expired:
+            now = time.monotonic()
+            if self.forced_at is None \
+                    or now - self.forced_at >= self.min_refresh_interval:
+                self.forced_at = now
+                self.refresh()
+                key = self.keys.get(kid)
+
+        return key
+
+    def verify(self, token, key):
+        '''
+        Verifies the signature and claims of token with a key from get() and
+        returns its payload. Raises the same jose errors as jwt.decode
+        '''
+        return jwt.decode(token, key, **self.claims)
+
+
+key_registry = KeyRegistry(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+
+
+## Verified Token Cache
+
+class TokenCache:
+    '''
+    Payloads of tokens that already passed verify_decode_jwt, by the
+    SHA-256 of the token, so a token sent again skips the signature check.
+    An entry is dropped once the token's exp has passed, or once keys no
+    longer has the key that signed it, so a token signed with a rotated out
+    key is verified again and refused. The least recently used entry is
+    dropped when there are more than max_size. Tokens without an exp claim
+    are never cached.
+
+    hits and misses count lookups, for checking the cache is doing its job
+    '''
+
+    def __init__(self, keys, max_size=1024):
+        self.keys = keys
+        self.max_size = max_size
+        # token digest -> (exp, kid, payload)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _miss(self, digest):
+        with self.lock:
+            self.entries.pop(digest, None)
+            self.misses += 1
+
+    def get(self, token):
+        digest = hashlib.sha256(token.encode('utf-8')).digest()
+        with self.lock:
+            entry = self.entries.get(digest)
+
+        if entry is None or entry[0] <= time.time():
+            self._miss(digest)
+            return None
+
+        # outside the lock, this may fetch the key set. if that fails the
+        # token goes through verify_decode_jwt, which answers 401
+        exp, kid, payload = entry
+        try:
+            key = self.keys.get(kid)
+        except Exception:
+            key = None
+        if key is None:
+            self._miss(digest)
+            return None
+
+        with self.lock:
+            if digest in self.entries:
+                self.entries.move_to_end(digest)
+            self.hits += 1
+        return payload
+
+    def set(self, token, payload, kid):
+        exp = payload.get('exp')
+        if not isinstance(exp, (int, float)):
+            return
+
+        digest = hashlib.sha256(token.encode('utf-8')).digest()
+        with self.lock:
+            self.entries[digest] = (exp, kid, payload)
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.entries)
+                }
+
+
+token_cache = TokenCache(key_registry)
+
 ## Auth Header
 
 '''
@@ -130,34 +328,13 @@ def verify_decode_jwt(token):
         }, 401)
 
     # verify the token
-    # get the JSON url for the jwt
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-
-    # get the public JSON web key to verify the signature
-    jwkids = json.loads(jsonurl.read())
-
-    # match kids from private and public keys
-    rsa_key = {}
-    for key in jwkids['keys']:
-        #print(key['kid'])
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-                }
+    # get the parsed public key matching the kid of the token. keys are
+    # fetched from Auth0 once, not on every request
+    rsa_key = key_registry.get(unverified_header['kid'])
 
     if rsa_key:
         try:
-            payload = jwt.decode(
-                token,
-                rsa_key,
-                algorithms=ALGORITHMS,
-                audience=API_AUDIENCE,
-                issuer='https://' + AUTH0_DOMAIN + '/'
-            )
+            payload = key_registry.verify(token, rsa_key)
             return payload
 
         except jwt.ExpiredSignatureError:
@@ -197,10 +374,19 @@ def requires_auth(permission=''):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            try:
-                payload = verify_decode_jwt(token)
-            except:
-                abort(401)
+
+            # a token that was verified before is only checked for expiry
+            # and for its key still being in the key set. the payload is
+            # shared between requests, so don't modify it
+            payload = token_cache.get(token)
+            if payload is None:
+                try:
+                    payload = verify_decode_jwt(token)
+                except:
+                    abort(401)
+                # verify_decode_jwt made sure the header has a kid
+                token_cache.set(token, payload,
+                                jwt.get_unverified_header(token)['kid'])
 
             check_permissions(permission, payload)
 
@@ -0,0 +1,97 @@
+'''
+The /drinks and /drinks-detail bodies, serialized and gzipped once per
+version of the menu. Committing a Drink insert, update or delete through
+this process' session moves to a new version.
+'''
+import gzip
+import hashlib
+import json
+import threading
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .database.models import Drink
+
+
+class MenuBody:
+    '''
+    One serialized menu, plain and gzipped, with an ETag for each
+    '''
+
+    def __init__(self, drinks):
+        self.body = json.dumps({
+            "drinks": drinks,
+            "success": True
+            }, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        # mtime=0 so the same menu always compresses to the same bytes
+        self.gzip_body = gzip.compress(self.body, mtime=0)
+        self.gzip_etag = f'{self.etag}-gzip'
+
+    def response(self):
+        '''
+        Returns the body as a response, gzipped if the client accepts it
+        and 304 Not Modified if the client already has it
+        '''
+        if request.accept_encodings['gzip']:
+            response = Response(self.gzip_body, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+            response.set_etag(self.gzip_etag)
+        else:
+            response = Response(self.body, mimetype='application/json')
+            response.set_etag(self.etag)
+
+        response.vary.add('Accept-Encoding')
+        return response.make_conditional(request)
+
+
+class MenuEntry:
+    def __init__(self, version, drinks):
+        self.version = version
+        self.short = MenuBody([drink.short() for drink in drinks])
+        self.long = MenuBody([drink.long() for drink in drinks])
+
+
+class MenuSnapshot:
+    def __init__(self):
+        self.version = 0
+        self.entry = None
+        self.lock = threading.Lock()
+
+        event.listen(Session, 'after_flush', self.track_changes)
+        event.listen(Session, 'after_commit', self.invalidate)
+        event.listen(Session, 'after_rollback', self.forget_changes)
+
+    def track_changes(self, session, flush_context):
+        changed = session.new | session.dirty | session.deleted
+        if any(isinstance(obj, Drink) for obj in changed):
+            session.info['menu_changed'] = True
+
+    def forget_changes(self, session):
+        session.info.pop('menu_changed', None)
+
+    def invalidate(self, session):
+        if session.info.pop('menu_changed', False):
+            self.version += 1
+
+    def get(self):
+        '''
+        Returns the MenuEntry for the current version, querying the
+        database only if a drink changed since it was built
+        '''
+        entry = self.entry
+        if entry is not None and entry.version == self.version:
+            return entry
+
+        with self.lock:
+            # another request may have rebuilt it while this one waited
+            entry = self.entry
+            version = self.version
+            if entry is None or entry.version != version:
+                drinks = Drink.query.order_by(Drink.id).all()
+                entry = self.entry = MenuEntry(version, drinks)
+            return entry
+
+
+menu_snapshot = MenuSnapshot()
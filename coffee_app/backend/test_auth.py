@@ -0,0 +1,133 @@
+import time
+import unittest
+from unittest import mock
+
+from flask import Flask
+from jose import jwt
+
+from src.auth import auth
+from src.auth.auth import TokenCache, requires_auth
+
+
+class FakeKeyRegistry:
+    '''
+    Stands in for key_registry, keys can be taken out to rotate them
+    '''
+
+    def __init__(self, *kids):
+        self.keys = {kid: object() for kid in kids}
+
+    def get(self, kid):
+        return self.keys.get(kid)
+
+
+class RequiresAuthTestCase(unittest.TestCase):
+    '''
+    This class represents requires_auth with the token cache, the
+    signature check is replaced so no Auth0 keys are needed
+    '''
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        # AuthError isn't handled here, let it reach the test
+        self.app.testing = True
+
+        @self.app.route('/drinks-detail')
+        @requires_auth('get:drinks-detail')
+        def drinks_detail():
+            return 'ok'
+
+        @self.app.route('/drinks', methods=['POST'])
+        @requires_auth('post:drinks')
+        def post_drink():
+            return 'ok'
+
+        self.client = self.app.test_client()
+
+        self.registry = FakeKeyRegistry('first', 'second')
+        patcher = mock.patch.object(auth, 'token_cache',
+                                    TokenCache(self.registry))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def token(self, payload, kid='first'):
+        # only the header is read outside verify_decode_jwt, which is patched
+        return jwt.encode(payload, 'secret', algorithm='HS256',
+                          headers={'kid': kid})
+
+    def get_drinks_detail(self, token):
+        return self.client.get('/drinks-detail',
+                               headers={'Authorization': f'Bearer {token}'})
+
+    def test_cache_hit_skips_verify(self):
+        payload = {'exp': time.time() + 60, 'permissions': ['get:drinks-detail']}
+        token = self.token(payload)
+        with mock.patch.object(auth, 'verify_decode_jwt',
+                               return_value=payload) as verify:
+            for i in range(3):
+                self.assertEqual(self.get_drinks_detail(token).status_code, 200)
+
+        self.assertEqual(verify.call_count, 1)
+        self.assertEqual(auth.token_cache.stats(),
+                         {'hits': 2, 'misses': 1, 'size': 1})
+
+    def test_rotated_key_bypasses_cache(self):
+        payload = {'exp': time.time() + 60, 'permissions': ['get:drinks-detail']}
+        token = self.token(payload, kid='first')
+        with mock.patch.object(auth, 'verify_decode_jwt',
+                               return_value=payload):
+            self.get_drinks_detail(token)
+
+        # the key set no longer has the key that signed the token, so the
+        # cached payload is dropped and the token goes to verify_decode_jwt
+        del self.registry.keys['first']
+        with mock.patch.object(auth, 'verify_decode_jwt',
+                               side_effect=auth.AuthError({}, 401)) as verify:
+            res = self.get_drinks_detail(token)
+
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(verify.call_count, 1)
+        self.assertEqual(auth.token_cache.stats()['size'], 0)
+
+    def test_other_keys_stay_cached(self):
+        payload = {'exp': time.time() + 60, 'permissions': ['get:drinks-detail']}
+        first = self.token(dict(payload, sub='first'), kid='first')
+        second = self.token(dict(payload, sub='second'), kid='second')
+        with mock.patch.object(auth, 'verify_decode_jwt',
+                               return_value=payload):
+            self.get_drinks_detail(first)
+            self.get_drinks_detail(second)
+
+        del self.registry.keys['first']
+        with mock.patch.object(auth, 'verify_decode_jwt') as verify:
+            res = self.get_drinks_detail(second)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(verify.call_count, 0)
+
+    def test_expired_token_verified_again(self):
+        payload = {'exp': time.time() - 1, 'permissions': ['get:drinks-detail']}
+        token = self.token(payload)
+        with mock.patch.object(auth, 'verify_decode_jwt',
+                               return_value=payload) as verify:
+            self.get_drinks_detail(token)
+            self.get_drinks_detail(token)
+
+        self.assertEqual(verify.call_count, 2)
+
+    def test_cached_payload_still_checks_permission(self):
+        payload = {'exp': time.time() + 60, 'permissions': ['get:drinks-detail']}
+        token = self.token(payload)
+        auth.token_cache.set(token, payload, 'first')
+
+        with self.assertRaises(auth.AuthError) as raised:
+            with mock.patch.object(auth, 'verify_decode_jwt') as verify:
+                self.client.post('/drinks',
+                                 headers={'Authorization': f'Bearer {token}'})
+
+        self.assertEqual(raised.exception.status_code, 403)
+        self.assertEqual(verify.call_count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Copies the shared modules in this directory into the apps that use them
+
+Every app here is deployed on its own, from its own directory, so instead
+of installing these modules each app keeps a copy next to its code. The
+copies are written by this script with a header pointing back here; edit
+the module in common/ and run
+
+    python common/vendor.py
+
+to update them. With --check nothing is written, and the exit status is 1
+if any copy differs from its source, for running before a commit.
+"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+COMMON = Path(__file__).resolve().parent
+
+BOOKSHELF = [f"bookshelf_app/{stage}/backend" for stage in (
+    "1_requests", "2_errors", "3_Testing_Starter", "4_TDD_Starter",
+    "5_API_Doc_Starter", "6_Final_Starter")]
+
+# module: directories that import it
+COPIES = {
+    "db_pool.py": [
+        "capstone/starter", "coffee_app/backend/src", "flask_cors_example",
+        "fyyur_app", "trivia_api/starter/backend"] + BOOKSHELF,
+    "fast_json.py": [
+        "capstone/starter", "flask_cors_example",
+        "trivia_api/starter/backend"] + BOOKSHELF,
+    "query_profiler.py": [
+        "capstone/starter", "coffee_app/backend/src", "fyyur_app", "todoapp",
+        "trivia_api/starter/backend"] + BOOKSHELF
+}
+
+HEADER = ("# Vendored from common/{module}, edit it there and run\n"
+          "# python common/vendor.py to update this copy.\n")
+
+
+def vendored(module):
+    source = (COMMON / module).read_text()
+    return HEADER.format(module=module) + source
+
+
+def main():
+    check = "--check" in sys.argv[1:]
+    stale = []
+
+    for module, directories in COPIES.items():
+        text = vendored(module)
+        for directory in directories:
+            path = ROOT / directory / module
+            if path.exists() and path.read_text() == text:
+                continue
+            stale.append(path.relative_to(ROOT))
+            if not check:
+                path.write_text(text)
+
+    for path in stale:
+        print(f"{'differs' if check else 'updated'}: {path}")
+
+    if check and stale:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# Vendored from common/db_pool.py, edit it there and run
+# python common/vendor.py to update this copy.
+'''
+Database connection pool settings and metrics
+
+engine_options_from_env() builds SQLALCHEMY_ENGINE_OPTIONS from environment
+variables, so the number of connections each worker holds can be tuned to
+fit under the database's max_connections without code changes:
+
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options_from_env(uri)
+    PoolMetrics(app, db)
+
+PoolMetrics adds a /metrics endpoint reporting how the pool is used. It has
+no authentication, so it answers 404 unless the POOL_METRICS_ENABLED
+app.config option is set, which defaults to DB_POOL_METRICS. Only enable
+it where the port isn't reachable from outside.
+
+environment variables
+    DB_POOL_SIZE            connections kept open per process (default 5)
+    DB_MAX_OVERFLOW         extra connections opened when the pool is
+                            empty and closed again when returned (default 10)
+    DB_POOL_TIMEOUT         seconds to wait for a connection once size +
+                            overflow are all checked out (default 30)
+    DB_POOL_RECYCLE         seconds after which a connection is replaced,
+                            so idle connections dropped by a proxy or the
+                            server aren't reused (default 1800, -1 disables)
+    DB_POOL_PRE_PING        1 to test connections when they are checked
+                            out and reconnect if they died (default 1)
+    DB_STATEMENT_TIMEOUT    milliseconds after which PostgreSQL cancels a
+                            statement (default 0, no limit)
+    DB_POOL_METRICS         1 to serve /metrics (default 0)
+
+SQLite keeps its own pooling, only DB_POOL_PRE_PING applies to it.
+'''
+import os
+import threading
+import time
+from flask import abort, current_app, jsonify
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+
+class MeteredQueuePool(QueuePool):
+    '''
+    A QueuePool that counts checkouts, new connections, and checkouts that
+    had to wait because size + overflow connections were already in use
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+
+    def connect(self):
+        # every connection is in use, this checkout blocks until one is
+        # returned or DB_POOL_TIMEOUT passes
+        must_wait = self.checkedin() == 0 and \
+            self.checkedout() >= self.size() + self._max_overflow
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except Exception:
+            if must_wait:
+                with self.metrics_lock:
+                    self.timeouts += 1
+            raise
+
+        with self.metrics_lock:
+            self.checkouts += 1
+            if must_wait:
+                self.waits += 1
+                self.wait_seconds += time.perf_counter() - start
+        return connection
+
+    def _create_connection(self):
+        with self.metrics_lock:
+            self.connects += 1
+        return super()._create_connection()
+
+    def recreate(self):
+        # a new pool is created when the engine is disposed, keep counting
+        pool = super().recreate()
+        pool.checkouts = self.checkouts
+        pool.connects = self.connects
+        pool.waits = self.waits
+        pool.wait_seconds = self.wait_seconds
+        pool.timeouts = self.timeouts
+        return pool
+
+
+def _env_int(environ, name, default):
+    return int(environ.get(name, default))
+
+
+def engine_options_from_env(database_uri, environ=os.environ):
+    '''
+    Returns SQLALCHEMY_ENGINE_OPTIONS for database_uri configured from the
+    DB_* environment variables
+    '''
+    options = {
+        'pool_pre_ping': environ.get('DB_POOL_PRE_PING', '1') == '1'
+        }
+
+    if make_url(database_uri).get_backend_name() == 'sqlite':
+        return options
+
+    options.update({
+        'poolclass': MeteredQueuePool,
+        'pool_size': _env_int(environ, 'DB_POOL_SIZE', 5),
+        'max_overflow': _env_int(environ, 'DB_MAX_OVERFLOW', 10),
+        'pool_timeout': _env_int(environ, 'DB_POOL_TIMEOUT', 30),
+        'pool_recycle': _env_int(environ, 'DB_POOL_RECYCLE', 1800)
+        })
+
+    statement_timeout = _env_int(environ, 'DB_STATEMENT_TIMEOUT', 0)
+    if statement_timeout > 0:
+        options['connect_args'] = {
+            'options': f'-c statement_timeout={statement_timeout}'
+            }
+
+    return options
+
+
+def pool_metrics(engine):
+    '''
+    Returns the current state of engine's connection pool as a dict
+    '''
+    pool = engine.pool
+    metrics = {'pool': type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        metrics.update({
+            'size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            # negative while fewer than size connections have been opened
+            'overflow': max(pool.overflow(), 0)
+            })
+
+    if isinstance(pool, MeteredQueuePool):
+        with pool.metrics_lock:
+            metrics.update({
+                'checkouts': pool.checkouts,
+                'connects': pool.connects,
+                'waits': pool.waits,
+                'wait_seconds': round(pool.wait_seconds, 6),
+                'timeouts': pool.timeouts
+                })
+
+    return metrics
+
+
+class PoolMetrics:
+    def __init__(self, app=None, db=None):
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('POOL_METRICS_ENABLED',
+                              os.environ.get('DB_POOL_METRICS', '0') == '1')
+
+        def metrics():
+            if not current_app.config['POOL_METRICS_ENABLED']:
+                abort(404)
+
+            return jsonify({
+                'success': True,
+                'database_pool': pool_metrics(db.engine)
+                })
+
+        app.add_url_rule('/metrics', 'metrics', metrics)
+        app.extensions['pool_metrics'] = self
@@ -2,6 +2,12 @@ from flask import Flask, jsonify, request, abort
 from flask_cors import CORS, cross_origin
 from flask_migrate import Migrate
 from models import setup_db, Plant
+from db_pool import PoolMetrics
+from fast_json import json_response, project
+
+# the columns of Plant.format(), read straight from the result rows
+PLANT_COLUMNS = (Plant.id, Plant.name, Plant.scientific_name,
+                 Plant.is_poisonous, Plant.primary_color)
 
 def create_app(test_config=None):
 
@@ -9,6 +15,7 @@ def create_app(test_config=None):
     app = Flask(__name__, instance_relative_config=True)
     db = setup_db(app)
     migrate = Migrate(app, db)
+    PoolMetrics(app, db)
 
     # first key in resources specifices what resources we are talking about
     # the inner key specifices what origins from the client can acces those resources at that URI
@@ -23,16 +30,19 @@ def create_app(test_config=None):
 
     @app.route('/plants', methods=["GET", "POST"])
     def get_plants():
-        page = request.args.get('page', 1, type=int)
+        page = max(request.args.get('page', 1, type=int), 1)
         start = (page  - 1) * 10
-        end = start + 10
-        plants = Plant.query.all()
-        formatted_plants = [plant.format() for plant in plants]
+
+        # only the page is read, LIMIT/OFFSET in the database
+        formatted_plants = project(
+            Plant.query.order_by(Plant.id).offset(start).limit(10),
+            PLANT_COLUMNS)
+        total_plants = Plant.query.count()
 
 
-        return jsonify({"success": True,
-                        "plants": formatted_plants[start:end],
-                        "total_plants": len(formatted_plants)})
+        return json_response({"success": True,
+                              "plants": formatted_plants,
+                              "total_plants": total_plants})
 
     @app.route('/plants/<int:plant_id>')
     def get_specific_plant(plant_id):
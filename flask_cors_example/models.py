@@ -4,6 +4,7 @@ from flask_sqlalchemy import SQLAlchemy
 import json
 from sqlalchemy.sql.schema import PrimaryKeyConstraint
 from some_info import password
+from db_pool import engine_options_from_env
 
 database_name = "plants"
 database_path ="postgresql://{}:{}@{}/{}".format('brown', password,'localhost:5432', database_name)
@@ -14,6 +15,7 @@ db = SQLAlchemy()
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options_from_env(database_path)
     db.app = app
     db.init_app(app)
     return db
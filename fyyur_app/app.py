@@ -22,7 +22,12 @@ from forms import *
 from flask_migrate import Migrate
 import sys
 from datetime import datetime
-from models import db, Venue, Artist, Show
+from collections import Counter
+from models import (db, Venue, Artist, Show, add_upcoming_shows,
+                    sweep_past_shows)
+from search import search
+from query_profiler import QueryProfiler, query_budget
+from db_pool import PoolMetrics
 
 
 #----------------------------------------------------------------------------#
@@ -34,6 +39,11 @@ moment = Moment(app)
 app.config.from_object('config')
 db.init_app(app)
 migrate = Migrate(app, db)
+profiler = QueryProfiler(app)
+pool_metrics = PoolMetrics(app, db)
+
+# number of shows listed per page on /shows
+SHOWS_PER_PAGE = 30
 
 
 #----------------------------------------------------------------------------#
@@ -63,82 +73,44 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@query_budget(1)
 def venues():
-  data = []
-  venues = Venue.query.all()
-
-  # make a list of city/state pairs
-  city_state_pairs = []  
-
+  # a single query returns every venue with its number of upcoming shows,
+  # read from the denormalized counter instead of counting shows
+  venues = db.session.query(Venue.id,
+                            Venue.name,
+                            Venue.city,
+                            Venue.state,
+                            Venue.upcoming_shows_count).\
+    order_by(Venue.state, Venue.city, Venue.name).all()
+
+  # group the venues by their city/state pair
+  areas = {}
   for venue in venues:
-    city = venue.city
-    state = venue.state
-    if (city, state) not in city_state_pairs:
-      city_state_pairs.append((city, state))
-
-    venue_id = venue.id
-    name = venue.name
-
-    num_upcoming_shows = 0
-    shows = db.session.query(Show).join(Venue, Show.venue_id==venue.id)
-    for show in shows:
-      if show.start_time > datetime.now():
-        num_upcoming_shows += 1
-
-    if len(data) == 0:
-      location = {'city': city,
-                  'state': state,
-                  'venues': [{
-                    'id': venue_id,
-                    'name': name,
-                    'num_upcoming_shows': num_upcoming_shows
-                  }]
-                  }
-      data.append(location)
-      continue
+    key = (venue.city, venue.state)
+    if key not in areas:
+      areas[key] = {'city': venue.city,
+                    'state': venue.state,
+                    'venues': []}
 
-    else:
-      for d in data:
-        if d['city'] == city and d['state'] == state:
-          location = {'id': venue_id,
-                      'name': name,
-                      'num_upcoming_shows': num_upcoming_shows}
-          d['venues'].append(location)
-          break
-
-        else:
-          location = {'city': city,
-                  'state': state,
-                  'venues': [{
-                    'id': venue_id,
-                    'name': name,
-                    'num_upcoming_shows': num_upcoming_shows
-                  }]
-                  }
-          data.append(location)
-          break
-
-  return render_template('pages/venues.html', areas=data);
+    areas[key]['venues'].append({'id': venue.id,
+                                 'name': venue.name,
+                                 'num_upcoming_shows': venue.upcoming_shows_count})
+
+  return render_template('pages/venues.html', areas=list(areas.values()))
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
   req = request.form['search_term']
 
-  search_query = f'%{req}%'
-  venues = Venue.query.filter(Venue.name.ilike(search_query)).all()
+  # ranked full-text search over name, city, state and genres
+  venues = search(Venue, req)
 
   data = []
   for venue in venues:
-
-    num_upcoming_shows = 0
-    shows = db.session.query(Show).join(Venue, Show.venue_id==venue.id)
-    for show in shows:
-      if show.start_time > datetime.now():
-        num_upcoming_shows += 1
-
     temp_venue = {'id': venue.id,
                   'name': venue.name,
-                  'num_upcoming_shows': num_upcoming_shows}
+                  'num_upcoming_shows': venue.upcoming_shows_count}
     data.append(temp_venue)
 
   response = {'count': len(venues),
@@ -148,19 +120,29 @@ def search_venues():
     search_term=request.form.get('search_term', ''))
 
 @app.route('/venues/<int:venue_id>')
+@query_budget(2)
 def show_venue(venue_id):
-  venue = Venue.query.get(venue_id)
+  venue = Venue.query.get_or_404(venue_id)
 
+  # the shows and their artists come back in one joined query, already
+  # split into past and upcoming by the database
   past_shows = []
   upcoming_shows = []
-  shows = db.session.query(Show).join(Venue, Show.venue_id==venue.id)
+  shows = db.session.query(Show.artist_id,
+                           Artist.name,
+                           Artist.image_link,
+                           Show.start_time,
+                           (Show.start_time > datetime.now()).label('upcoming')).\
+    join(Artist, Show.artist_id == Artist.id).\
+    filter(Show.venue_id == venue_id).\
+    order_by(Show.start_time).all()
 
   for show in shows:
     show_data = {'artist_id': show.artist_id,
-                 'artist_name': show.artist.name,
-                 'artist_image_link': show.artist.image_link,
+                 'artist_name': show.name,
+                 'artist_image_link': show.image_link,
                  'start_time': show.start_time.strftime("%m/%d/%Y, %H:%M")}
-    if show.start_time > datetime.now():
+    if show.upcoming:
       upcoming_shows.append(show_data)
     else:
       past_shows.append(show_data)
@@ -225,6 +207,13 @@ def delete_venue(venue_id):
   venue = Venue.query.get(venue_id)
   name = venue.name
   try:
+    # the venue's upcoming shows no longer count for their artists
+    now = datetime.now()
+    upcoming_by_artist = Counter(show.artist_id for show in venue.shows
+                                 if show.start_time and show.start_time > now)
+    add_upcoming_shows(Artist, {artist_id: -count for artist_id, count
+                                in upcoming_by_artist.items()})
+
     # shows will be deleted because of the cascade 'delete-orphan'
     db.session.delete(venue)
     db.session.commit()
@@ -258,21 +247,14 @@ def artists():
 def search_artists():
   req = request.form['search_term']
 
-  search_query = f'%{req}%'
-  artists = Artist.query.filter(Artist.name.ilike(search_query)).all()
+  # ranked full-text search over name, city, state and genres
+  artists = search(Artist, req)
 
   data = []
   for artist in artists:
-
-    num_upcoming_shows = 0
-    shows = db.session.query(Show).join(Artist, Show.venue_id==artist.id)
-    for show in shows:
-      if show.start_time > datetime.now():
-        num_upcoming_shows += 1
-
     temp_artist = {'id': artist.id,
                   'name': artist.name,
-                  'num_upcoming_shows': num_upcoming_shows}
+                  'num_upcoming_shows': artist.upcoming_shows_count}
     data.append(temp_artist)
 
   response = {'count': len(artists),
@@ -282,20 +264,30 @@ def search_artists():
     search_term=request.form.get('search_term', ''))
 
 @app.route('/artists/<int:artist_id>')
+@query_budget(2)
 def show_artist(artist_id):
 
-  artist = Artist.query.get(artist_id)
-  
+  artist = Artist.query.get_or_404(artist_id)
+
+  # the shows and their venues come back in one joined query, already
+  # split into past and upcoming by the database
   past_shows = []
   upcoming_shows = []
+  shows = db.session.query(Show.venue_id,
+                           Venue.name,
+                           Venue.image_link,
+                           Show.start_time,
+                           (Show.start_time > datetime.now()).label('upcoming')).\
+    join(Venue, Show.venue_id == Venue.id).\
+    filter(Show.artist_id == artist_id).\
+    order_by(Show.start_time).all()
 
-  shows = db.session.query(Show).join(Artist, Show.venue_id==artist.id)
   for show in shows:
     show_data = {'venue_id': show.venue_id,
-                 'venue_name': show.venue.name,
-                 'venue_image_link': show.venue.image_link,
+                 'venue_name': show.name,
+                 'venue_image_link': show.image_link,
                  'start_time': show.start_time.strftime("%m/%d/%Y, %H:%M")}
-    if show.start_time > datetime.now():
+    if show.upcoming:
       upcoming_shows.append(show_data)
     else:
       past_shows.append(show_data)
@@ -452,30 +444,69 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
+# parses a /shows cursor of the form "<start_time isoformat>,<show id>"
+def parse_show_cursor(value):
+  start_time, show_id = value.rsplit(',', 1)
+  return dateutil.parser.parse(start_time), int(show_id)
+
 @app.route('/shows')
+@query_budget(1)
 def shows():
+  # optional half-open date range ?from=<datetime>&until=<datetime>
+  date_from = request.args.get('from', None, type=dateutil.parser.parse)
+  date_until = request.args.get('until', None, type=dateutil.parser.parse)
+  # keyset cursor: the (start_time, id) of the last show on the previous page
+  after = request.args.get('after', None, type=parse_show_cursor)
+
+  # one joined query selecting only what the template needs
+  query = db.session.query(Show.id,
+                           Show.start_time,
+                           Show.venue_id,
+                           Venue.name.label('venue_name'),
+                           Show.artist_id,
+                           Artist.name.label('artist_name'),
+                           Artist.image_link.label('artist_image_link')).\
+    join(Venue, Show.venue_id == Venue.id).\
+    join(Artist, Show.artist_id == Artist.id).\
+    filter(Show.start_time.isnot(None))
+
+  if date_from is not None:
+    query = query.filter(Show.start_time >= date_from)
+  if date_until is not None:
+    query = query.filter(Show.start_time < date_until)
+  if after is not None:
+    after_start_time, after_id = after
+    query = query.filter(db.or_(Show.start_time > after_start_time,
+                                db.and_(Show.start_time == after_start_time,
+                                        Show.id > after_id)))
+
+  # fetch one extra row to know if there is another page
+  shows = query.order_by(Show.start_time, Show.id).\
+    limit(SHOWS_PER_PAGE + 1).all()
+
+  next_url = None
+  if len(shows) > SHOWS_PER_PAGE:
+    shows = shows[:SHOWS_PER_PAGE]
+    last_show = shows[-1]
+    next_args = {'after': f'{last_show.start_time.isoformat()},{last_show.id}'}
+    if date_from is not None:
+      next_args['from'] = request.args['from']
+    if date_until is not None:
+      next_args['until'] = request.args['until']
+    next_url = url_for('shows', **next_args)
 
-  shows = Show.query.all()
   shows_data = []
   for show in shows:
-    venue_id = show.venue.id
-    venue_name = Venue.query.get(venue_id).name
-
-    artist_id = show.artist.id
-    artist_name = Artist.query.get(artist_id).name
-    artist_image_link = Artist.query.get(artist_id).image_link
-
-    start_time = show.start_time.strftime("%m/%d/%Y, %H:%M")
-
-    show_data = {'venue_id': venue_id,
-                 'venue_name': venue_name,
-                 'artist_id': artist_id,
-                 'artist_name': artist_name,
-                 'artist_image_link': artist_image_link,
-                 'start_time': start_time}
+    show_data = {'venue_id': show.venue_id,
+                 'venue_name': show.venue_name,
+                 'artist_id': show.artist_id,
+                 'artist_name': show.artist_name,
+                 'artist_image_link': show.artist_image_link,
+                 'start_time': show.start_time.strftime("%m/%d/%Y, %H:%M")}
     shows_data.append(show_data)
 
-  return render_template('pages/shows.html', shows=shows_data)
+  return render_template('pages/shows.html', shows=shows_data,
+    next_url=next_url)
 
 @app.route('/shows/create')
 def create_shows():
@@ -500,6 +531,9 @@ def create_show_submission():
                 start_time = form.start_time.data)
 
     db.session.add(show)
+    if show.start_time > datetime.now():
+      add_upcoming_shows(Venue, {show.venue_id: 1})
+      add_upcoming_shows(Artist, {show.artist_id: 1})
     db.session.commit()
     flash('Show was successfully lsited!')
   except:
@@ -513,6 +547,12 @@ def create_show_submission():
 
   return render_template('pages/home.html')
 
+@app.cli.command('sweep-shows')
+def sweep_shows_command():
+  # run periodically (e.g. from cron) so shows that have started stop
+  # counting towards the upcoming show counters
+  sweep_past_shows()
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -0,0 +1,155 @@
+'''
+Queries and time per request of fyyur pages as the database grows
+
+Seeds the database at BENCHMARK_DATABASE_URL with each number of venues in
+turn, requests every page in PAGES and prints how many queries it ran (from
+query_profiler's Server-Timing header) and how long it took. Exits with an
+error if a page's query count changes with the number of rows, which would
+mean a query per row has crept back in. Every request is also held to the
+@query_budget of its view in app.py, and fails if it goes over.
+
+The database is migrated to the latest revision and its tables are emptied,
+so don't point it at one whose data you want to keep:
+
+    export BENCHMARK_DATABASE_URL=postgresql://brown:<password>@localhost:5432/fyyur_benchmark
+    python benchmark_queries.py 1000 10000 100000
+'''
+import os
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask_migrate import upgrade
+from sqlalchemy import text
+
+from app import app
+from db_pool import engine_options_from_env
+from models import db, Venue, Artist, Show
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'migrations')
+
+# requests timed per page and size
+RUNS = 3
+SEED_BATCH_SIZE = 10000
+SHOWS_PER_VENUE = 4
+
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'),
+          ('Seattle', 'WA'), ('Chicago', 'IL')]
+GENRES = ['Jazz', 'Reggae', 'Swing', 'Classical', 'Folk', 'Rock']
+
+# the detail pages of venue 1 and artist 1, which have the most shows
+PAGES = ['/venues', '/venues/1', '/artists/1']
+
+QUERY_COUNT_PATTERN = re.compile(r'desc="(\d+) queries"')
+
+
+def use_benchmark_database():
+    url = os.environ['BENCHMARK_DATABASE_URL']
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options_from_env(url)
+    # a page over its @query_budget raises instead of logging a warning
+    app.config['QUERY_BUDGET_RAISE'] = True
+
+
+def insert(table, rows):
+    for start in range(0, len(rows), SEED_BATCH_SIZE):
+        db.session.execute(table.insert(), rows[start:start + SEED_BATCH_SIZE])
+
+
+def seed(rows):
+    '''
+    Empties the tables and adds rows venues and rows artists spread over
+    CITIES, with SHOWS_PER_VENUE shows each, half of them upcoming. Venue 1
+    and artist 1 also get a show with every tenth venue or artist, so their
+    detail pages grow with rows
+    '''
+    db.session.execute(text('TRUNCATE show, venue, artist RESTART IDENTITY'))
+
+    # (venue id, artist id, upcoming)
+    pairs = []
+    for i in range(rows * SHOWS_PER_VENUE):
+        # every venue and every artist gets the same mix of past and
+        # upcoming shows
+        pairs.append((i % rows + 1, (i + i // rows) % rows + 1,
+                      i // rows >= SHOWS_PER_VENUE // 2))
+    for i in range(0, rows, 10):
+        pairs.append((1, i + 1, i % 20 == 0))
+        pairs.append((i + 1, 1, i % 20 == 0))
+
+    now = datetime.now()
+    shows = []
+    upcoming_shows_count = {Venue: Counter(), Artist: Counter()}
+    for i, (venue_id, artist_id, upcoming) in enumerate(pairs):
+        shows.append({
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'start_time': now + timedelta(days=30 if upcoming else -30,
+                                          minutes=i)
+            })
+        if upcoming:
+            upcoming_shows_count[Venue][venue_id] += 1
+            upcoming_shows_count[Artist][artist_id] += 1
+
+    for model in (Venue, Artist):
+        name = model.__name__.lower()
+        insert(model.__table__, [{
+            'name': f'{name} {i}',
+            'city': CITIES[i % len(CITIES)][0],
+            'state': CITIES[i % len(CITIES)][1],
+            'phone': '555-555-5555',
+            'genres': [GENRES[i % len(GENRES)]],
+            'upcoming_shows_count': upcoming_shows_count[model][i + 1]
+            } for i in range(rows)])
+    insert(Show.__table__, shows)
+
+    db.session.commit()
+
+
+def measure(client, page):
+    '''
+    Returns the query counts seen over RUNS requests of page and the mean
+    seconds per request
+    '''
+    counts = set()
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        response = client.get(page)
+        if response.status_code != 200:
+            sys.exit(f'{page} answered {response.status_code}')
+        match = QUERY_COUNT_PATTERN.search(response.headers['Server-Timing'])
+        counts.add(int(match.group(1)))
+    return counts, (time.perf_counter() - start) / RUNS
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+
+    use_benchmark_database()
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+
+    client = app.test_client()
+    query_counts = {page: set() for page in PAGES}
+
+    for rows in sizes:
+        with app.app_context():
+            seed(rows)
+
+        for page in PAGES:
+            counts, seconds = measure(client, page)
+            query_counts[page] |= counts
+            print(f'{rows:>8} venues  {page:<14} '
+                  f'{"/".join(str(count) for count in sorted(counts)):>3} '
+                  f'queries  {seconds * 1000:9.1f} ms')
+
+    grown = [page for page, counts in query_counts.items() if len(counts) > 1]
+    if grown:
+        sys.exit('query count changed with the number of rows: '
+                 + ', '.join(grown))
+
+
+if __name__ == '__main__':
+    main()
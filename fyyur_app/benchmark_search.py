@@ -0,0 +1,97 @@
+'''
+Venue search latency, substring scan against search.search()
+
+Seeds the database at BENCHMARK_DATABASE_URL with each number of venues in
+turn and prints the mean time of each search term two ways:
+
+    scan    name ILIKE '%term%' with index scans turned off, which is how
+            search_venues() ran before the search indexes
+    search  search.search(), the tsvector and trigram index query
+
+Like benchmark_queries.py, the database is migrated to the latest revision
+and its tables are emptied:
+
+    export BENCHMARK_DATABASE_URL=postgresql://brown:<password>@localhost:5432/fyyur_benchmark
+    python benchmark_search.py 10000 100000 1000000
+'''
+import sys
+import time
+
+from flask_migrate import upgrade
+from sqlalchemy import text
+
+from app import app
+from benchmark_queries import (MIGRATIONS, CITIES, GENRES, insert,
+                               use_benchmark_database)
+from models import db, Venue
+from search import search
+
+# searches timed per term, method and size
+RUNS = 5
+
+WORDS = ['musical', 'hop', 'park', 'dueling', 'pianos', 'bar', 'coffee',
+         'house', 'theater', 'hall', 'garden', 'club', 'lounge']
+
+TERMS = ['hop', 'park', 'coffee house', 'jazz', 'san fran', 'garden 123']
+
+
+def seed(rows):
+    '''
+    Empties the tables and adds rows venues with two-word names, spread over
+    CITIES and GENRES. search_vector is filled in by the database trigger
+    '''
+    db.session.execute(text('TRUNCATE show, venue, artist RESTART IDENTITY'))
+
+    insert(Venue.__table__, [{
+        'name': f'{WORDS[i % len(WORDS)]} {WORDS[i // len(WORDS) % len(WORDS)]} '
+                f'{i}',
+        'city': CITIES[i % len(CITIES)][0],
+        'state': CITIES[i % len(CITIES)][1],
+        'genres': [GENRES[i % len(GENRES)]]
+        } for i in range(rows)])
+
+    db.session.commit()
+    db.session.execute(text('ANALYZE venue'))
+    db.session.commit()
+
+
+def scan(term):
+    # the trigram index would serve this query too, keep the planner on the
+    # sequential scan the ILIKE used to get
+    db.session.execute(text('SET LOCAL enable_indexscan = off'))
+    db.session.execute(text('SET LOCAL enable_bitmapscan = off'))
+    return db.session.query(Venue.id, Venue.name, Venue.upcoming_shows_count).\
+        filter(Venue.name.ilike(f'%{term}%')).all()
+
+
+def measure(method, term):
+    '''
+    Returns the number of rows found and the mean seconds per search
+    '''
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        rows = method(term)
+        # ends the transaction, and with it the SET LOCALs
+        db.session.rollback()
+    return len(rows), (time.perf_counter() - start) / RUNS
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+
+    use_benchmark_database()
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+
+        for rows in sizes:
+            seed(rows)
+            for term in TERMS:
+                for name, method in (('scan', scan),
+                                     ('search', lambda term: search(Venue, term))):
+                    found, seconds = measure(method, term)
+                    print(f'{rows:>8} venues  {term!r:<14} {name:<7}'
+                          f'{found:>8} rows  {seconds * 1000:9.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""full-text and trigram search indexes for venue and artist
+
+Revision ID: 5c1e0f7b2d94
+Revises: 7509ef6b8f59
+Create Date: 2026-10-18 10:02:47.518230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e0f7b2d94'
+down_revision = '7509ef6b8f59'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # array_to_string() is not immutable, so the tsvector can't be a
+    # generated column or an expression index. a trigger keeps it up to date
+    op.execute('''
+        CREATE FUNCTION fyyur_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+                setweight(to_tsvector('simple',
+                    coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')),
+                    'B') ||
+                setweight(to_tsvector('simple',
+                    coalesce(array_to_string(NEW.genres, ' '), '')), 'C');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(),
+            nullable=True))
+        op.execute(f'''
+            CREATE TRIGGER {table}_search_vector_update
+            BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE PROCEDURE fyyur_search_vector_update()
+        ''')
+        # fire the trigger once for the existing rows
+        op.execute(f'UPDATE {table} SET name = name')
+
+        op.create_index(f'ix_{table}_search_vector', table, ['search_vector'],
+            postgresql_using='gin')
+        op.create_index(f'ix_{table}_name_trgm', table, ['name'],
+            postgresql_using='gin',
+            postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        op.drop_index(f'ix_{table}_name_trgm', table_name=table)
+        op.drop_index(f'ix_{table}_search_vector', table_name=table)
+        op.execute(f'DROP TRIGGER {table}_search_vector_update ON {table}')
+        op.drop_column(table, 'search_vector')
+
+    op.execute('DROP FUNCTION fyyur_search_vector_update()')
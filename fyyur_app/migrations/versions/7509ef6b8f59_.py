@@ -0,0 +1,40 @@
+"""add upcoming_shows_count to venue and artist
+
+Revision ID: 7509ef6b8f59
+Revises: 2ae5b55cc5b5
+Create Date: 2026-10-18 09:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7509ef6b8f59'
+down_revision = '2ae5b55cc5b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('artist', sa.Column('upcoming_shows_count', sa.Integer(),
+        server_default='0', nullable=False))
+    op.add_column('venue', sa.Column('upcoming_shows_count', sa.Integer(),
+        server_default='0', nullable=False))
+
+    # backfill the counters from the existing shows
+    op.execute('''
+        UPDATE venue SET upcoming_shows_count = (
+            SELECT count(*) FROM show
+            WHERE show.venue_id = venue.id AND show.start_time > now())
+    ''')
+    op.execute('''
+        UPDATE artist SET upcoming_shows_count = (
+            SELECT count(*) FROM show
+            WHERE show.artist_id = artist.id AND show.start_time > now())
+    ''')
+
+
+def downgrade():
+    op.drop_column('venue', 'upcoming_shows_count')
+    op.drop_column('artist', 'upcoming_shows_count')
@@ -1,4 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from datetime import datetime
 
 db = SQLAlchemy()
 
@@ -7,13 +9,17 @@ class Show(db.Model):
     Child to both Venue and Artist
     '''
     __tablename__ = 'show'
+    __table_args__ = (
+        # keyset pagination of /shows orders by (start_time, id)
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key = True)
     start_time = db.Column(db.DateTime)
     venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'),
-        nullable = False)
+        nullable = False, index = True)
     artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'),
-        nullable = False)
+        nullable = False, index = True)
 
 class Venue(db.Model):
     """
@@ -34,7 +40,14 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String)
     genres = db.Column(db.ARRAY(db.String), nullable = False)
-    shows = db.relationship('Show', backref = 'venue', lazy = 'joined',
+    # denormalized count of shows that have not started yet. kept up to date
+    # by add_upcoming_shows() and sweep_past_shows()
+    upcoming_shows_count = db.Column(db.Integer, nullable = False,
+        default = 0, server_default = '0')
+    # name, city/state and genres as a tsvector, filled in by a database
+    # trigger. deferred so it is only loaded when a search needs it
+    search_vector = db.deferred(db.Column(TSVECTOR))
+    shows = db.relationship('Show', backref = 'venue', lazy = 'select',
         cascade = 'all, delete-orphan')
 
 class Artist(db.Model):
@@ -54,5 +67,43 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String)
     genres = db.Column(db.ARRAY(db.String), nullable = False)
-    shows = db.relationship('Show', backref = 'artist', lazy = 'joined',
-        cascade = 'all, delete-orphan')
\ No newline at end of file
+    # denormalized count of shows that have not started yet. kept up to date
+    # by add_upcoming_shows() and sweep_past_shows()
+    upcoming_shows_count = db.Column(db.Integer, nullable = False,
+        default = 0, server_default = '0')
+    # name, city/state and genres as a tsvector, filled in by a database
+    # trigger. deferred so it is only loaded when a search needs it
+    search_vector = db.deferred(db.Column(TSVECTOR))
+    shows = db.relationship('Show', backref = 'artist', lazy = 'select',
+        cascade = 'all, delete-orphan')
+
+
+def add_upcoming_shows(model, counts):
+    '''
+    Adds to the upcoming show counter of Venue or Artist rows without
+    loading them. counts maps a row id to the amount to add (negative to
+    subtract). The caller commits
+    '''
+    for row_id, amount in counts.items():
+        model.query.filter(model.id == row_id).update(
+            {model.upcoming_shows_count: model.upcoming_shows_count + amount},
+            synchronize_session = False)
+
+def sweep_past_shows():
+    '''
+    Recounts upcoming shows for the venues and artists whose counter is
+    still positive, so shows that have started since the last sweep stop
+    being counted. Shows only move from upcoming to past, so a counter of 0
+    never needs a recount. Meant to be run periodically (flask sweep-shows)
+    '''
+    now = datetime.now()
+    for model, foreign_key in ((Venue, Show.venue_id),
+                               (Artist, Show.artist_id)):
+        upcoming = db.session.query(db.func.count(Show.id)).\
+            filter(foreign_key == model.id, Show.start_time > now).\
+            scalar_subquery()
+        model.query.filter(model.upcoming_shows_count > 0).update(
+            {model.upcoming_shows_count: upcoming},
+            synchronize_session = False)
+
+    db.session.commit()
@@ -0,0 +1,46 @@
+'''
+Venue and artist search
+
+Searches run against the search_vector tsvector column (kept up to date by
+a trigger, see migration 5c1e0f7b2d94) and a trigram index on name, and
+results are ranked with ts_rank. The models use PostgreSQL's ARRAY and
+TSVECTOR types, so there is no other database to fall back to.
+'''
+import re
+from sqlalchemy import or_
+from models import db
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    '''
+    Splits text into lowercase word tokens
+    '''
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def search(model, term):
+    '''
+    Returns the (id, name, upcoming_shows_count) rows of Venue or Artist that
+    match term, best match first
+    '''
+    columns = (model.id, model.name, model.upcoming_shows_count)
+
+    # every word of the term is matched as a prefix: 'mus ho' -> 'mus:* & ho:*'
+    query_text = ' & '.join(f'{token}:*' for token in tokenize(term))
+
+    # the trigram index keeps the old substring match on name fast
+    name_match = model.name.ilike(f'%{term}%')
+    if not query_text:
+        return db.session.query(*columns).filter(name_match).\
+            order_by(model.name).all()
+
+    ts_query = db.func.to_tsquery('simple', query_text)
+    rank = db.func.ts_rank(model.search_vector, ts_query)
+
+    return db.session.query(*columns).\
+        filter(or_(model.search_vector.op('@@')(ts_query), name_match)).\
+        order_by(rank.desc(), model.name).all()
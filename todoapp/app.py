@@ -2,9 +2,11 @@ from some_info import password
 from flask import Flask, render_template, request, redirect, url_for, jsonify, abort
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from query_profiler import QueryProfiler
 import sys
 
 PASSWORD = password
+TODOS_PER_PAGE = 50
 
 # __name__ is name of the file
 app = Flask(__name__)
@@ -13,6 +15,7 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
+profiler = QueryProfiler(app)
 
 # individual todo items
 class Todo(db.Model):
@@ -22,6 +25,9 @@ class Todo(db.Model):
     completed = db.Column(db.Boolean, nullable=False, default=False)
     list_id = db.Column(db.Integer, db.ForeignKey('todolists.id'), nullable = False)
 
+    # list pages and whole-list updates look todos up by list
+    __table_args__ = (db.Index('ix_todos_list_id_id', 'list_id', 'id'),)
+
 
     def __repr__(self):
         return f'<Todo {self.id} {self.description}>'
@@ -88,6 +94,46 @@ def set_completed_todo(todo_id):
 
     return redirect(url_for('index'))
 
+# handler to set many todos as completed or not completed at once
+# expects {"ids": [1, 2, 3], "completed": true}
+@app.route('/todos/set-completed', methods=["POST"])
+def set_completed_todos():
+    # check the body before touching the database, bad input is a 400
+    temp_dictionary = request.get_json(silent=True)
+    if not isinstance(temp_dictionary, dict) \
+            or not isinstance(temp_dictionary.get('ids'), list):
+        abort(400)
+
+    # bool("false") is True, so only a JSON true or false is accepted
+    completed = temp_dictionary.get('completed')
+    if not isinstance(completed, bool):
+        abort(400)
+
+    try:
+        ids = [int(todo_id) for todo_id in temp_dictionary['ids']]
+    except (TypeError, ValueError):
+        abort(400)
+
+    error = False
+    body = {}
+    try:
+        # a single UPDATE ... WHERE id IN (...) instead of loading each todo
+        body['updated'] = Todo.query.filter(Todo.id.in_(ids)).update(
+            {'completed': completed}, synchronize_session=False)
+        db.session.commit()
+        body['success'] = True
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+    finally:
+        db.session.close()
+
+    if error:
+        abort(500)
+    else:
+        return jsonify(body)
+
 @app.route('/todos/<todo_id>', methods=['DELETE'])
 def delete_todo(todo_id):
     try:
@@ -132,13 +178,10 @@ def create_list():
 def set_completed_list(list_id):
     error = False
     try:
-        # get the children from the list and then set them to completed
-        todos_list = TodoList.query.get(list_id)
-        children = todos_list.todos
-
-        for child in children:
-            child.completed = True
-
+        # set the children of the list to completed with a single UPDATE
+        # instead of loading and changing them one at a time
+        Todo.query.filter_by(list_id=list_id).update(
+            {'completed': True}, synchronize_session=False)
         db.session.commit()
     except:
         db.session.rollback()
@@ -156,15 +199,16 @@ def set_completed_list(list_id):
 def delete_me_list(list_id):
     error = False
     try:
-        todos_list = TodoList.query.get(list_id)
-        children = todos_list.todos
-        if children:
-            for child in children:
-                db.session.delete(child)
-        db.session.delete(todos_list)
+        # delete the children with a single DELETE, then the list itself
+        Todo.query.filter_by(list_id=list_id).delete(synchronize_session=False)
+        deleted = TodoList.query.filter_by(id=list_id).delete(
+            synchronize_session=False)
+        if deleted == 0:
+            raise LookupError(f'no list {list_id}')
         db.session.commit()
     except:
         error=True
+        db.session.rollback()
         print(sys.exc_info())
     finally:
         db.session.close()
@@ -173,9 +217,9 @@ def delete_me_list(list_id):
         return jsonify({'success': False})
     else:
         # get the list with the greatest id and then pass that back so that page can be loaded
-        return_list = TodoList.query.order_by('id').all()[-1]
-        return_list_id = return_list.id
-        print(return_list_id)
+        # None when the last list was deleted
+        return_list = TodoList.query.order_by(TodoList.id.desc()).first()
+        return_list_id = return_list.id if return_list is not None else None
 
         return jsonify({'success': True, 'new_page_id': return_list_id}) 
 
@@ -188,11 +232,41 @@ def delete_me_list(list_id):
 # handler to load lists
 @app.route('/lists/<list_id>')
 def get_list_todos(list_id):
+    try:
+        list_id = int(list_id)
+    except ValueError:
+        abort(404)
+
+    # the sidebar: every list with its number of open and done todos, in one
+    # query. the active list is picked out of it instead of queried again
+    lists = db.session.query(
+        TodoList.id,
+        TodoList.name,
+        db.func.count(Todo.id).filter(Todo.completed == False).label('open_count'),
+        db.func.count(Todo.id).filter(Todo.completed == True).label('done_count')).\
+        outerjoin(Todo, Todo.list_id == TodoList.id).\
+        group_by(TodoList.id).order_by(TodoList.id).all()
+    active_list = next((todo_list for todo_list in lists if todo_list.id == list_id), None)
+
+    # todos are paged by id: ?after=<id of the last todo shown>. one extra row
+    # is fetched to know whether there is another page
+    todos_query = Todo.query.filter_by(list_id=list_id).order_by(Todo.id)
+    after = request.args.get('after', None, type=int)
+    if after is not None:
+        todos_query = todos_query.filter(Todo.id > after)
+    todos = todos_query.limit(TODOS_PER_PAGE + 1).all()
+
+    next_after = None
+    if len(todos) > TODOS_PER_PAGE:
+        todos = todos[:TODOS_PER_PAGE]
+        next_after = todos[-1].id
+
     return render_template(
         'index.html',
-        lists = TodoList.query.all(),
-        active_list = TodoList.query.get(list_id),
-        todos = Todo.query.filter_by(list_id=list_id).order_by('id').all())
+        lists = lists,
+        active_list = active_list,
+        todos = todos,
+        next_after = next_after)
 
 # home page. defaults to list_id=1
 @app.route('/')
@@ -0,0 +1,165 @@
+# Vendored from common/query_profiler.py, edit it there and run
+# python common/vendor.py to update this copy.
+'''
+Request-scoped SQL query profiling
+
+QueryProfiler hooks SQLAlchemy's cursor events and records, for each
+request, how many statements ran, how long they took in the database and
+which statements were repeated. Every response gets a Server-Timing header,
+statements repeated within one request are logged as possible N+1 queries,
+and requests that go over a query budget are logged or failed.
+
+    profiler = QueryProfiler(app)
+
+    @app.route('/things')
+    @query_budget(2)
+    def things():
+        ...
+
+app.config options
+    QUERY_BUDGET            default maximum number of queries per request.
+                            None (the default) means no limit
+    QUERY_BUDGET_RAISE      raise QueryBudgetExceeded when a request goes over
+                            its budget instead of logging a warning. defaults
+                            to app.testing, so test suites fail loudly
+    QUERY_REPEAT_THRESHOLD  how many times one statement may run in a request
+                            before it is logged as a possible N+1 (default 5)
+'''
+import re
+import time
+from collections import Counter
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# quoted strings and numbers, replaced so statements that only differ in
+# inlined values share a fingerprint
+LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class QueryBudgetExceeded(Exception):
+    def __init__(self, endpoint, count, budget):
+        super().__init__(
+            f'{endpoint} ran {count} queries, over its budget of {budget}')
+        self.endpoint = endpoint
+        self.count = count
+        self.budget = budget
+
+
+def fingerprint(statement):
+    '''
+    Normalizes a SQL statement so repeats of the same query with different
+    values compare equal
+    '''
+    return ' '.join(LITERAL_PATTERN.sub('?', statement).split())
+
+
+def query_budget(limit):
+    '''
+    Sets the maximum number of queries a view may run per request,
+    overriding QUERY_BUDGET. Place it below @app.route
+    '''
+    def query_budget_decorator(f):
+        f.query_budget = limit
+        return f
+    return query_budget_decorator
+
+
+class QueryStats:
+    '''
+    Queries run during one request
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold):
+        '''
+        Returns (fingerprint, times run) for statements run at least
+        threshold times
+        '''
+        return [(statement, times)
+                for statement, times in self.fingerprints.most_common()
+                if times >= threshold]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    conn.info.setdefault('query_start_times', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    start_times = conn.info.get('query_start_times')
+    if not start_times:
+        return
+    start_time = start_times.pop()
+
+    # queries outside of a request (create_all, CLI commands) aren't tracked
+    if not has_request_context():
+        return
+
+    stats = g.get('query_stats')
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - start_time)
+
+
+class QueryProfiler:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('QUERY_BUDGET', None)
+        app.config.setdefault('QUERY_BUDGET_RAISE', None)
+        app.config.setdefault('QUERY_REPEAT_THRESHOLD', 5)
+
+        # listening on the Engine class covers every engine the app creates,
+        # including ones Flask-SQLAlchemy creates lazily
+        for name, listener in (('before_cursor_execute', _before_cursor_execute),
+                               ('after_cursor_execute', _after_cursor_execute)):
+            if not event.contains(Engine, name, listener):
+                event.listen(Engine, name, listener)
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.extensions['query_profiler'] = self
+
+    def _start_request(self):
+        g.query_stats = QueryStats()
+
+    def _finish_request(self, response):
+        # popped so error responses built after a failure aren't checked twice
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries"')
+
+        config = current_app.config
+        for statement, times in stats.repeated(config['QUERY_REPEAT_THRESHOLD']):
+            current_app.logger.warning(
+                'possible N+1 in %s: ran %d times: %s',
+                request.endpoint, times, statement)
+
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', config['QUERY_BUDGET'])
+        if budget is not None and stats.count > budget:
+            error = QueryBudgetExceeded(request.endpoint, stats.count, budget)
+            should_raise = config['QUERY_BUDGET_RAISE']
+            if should_raise is None:
+                should_raise = current_app.testing
+            if should_raise:
+                raise error
+            current_app.logger.warning(str(error))
+
+        return response
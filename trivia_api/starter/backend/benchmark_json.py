@@ -0,0 +1,111 @@
+'''
+Serialization time of the question list endpoints, jsonify against fast_json
+
+For each endpoint the same page of questions is turned into a response two
+ways:
+
+    jsonify     Question objects, their format() dicts and Flask's jsonify,
+                how the endpoints answered before fast_json
+    fast_json   project() rows and json_response(), how they answer now
+
+and the mean time per response is printed, after checking both bodies
+decode to the same JSON. Seeds the database at BENCHMARK_DATABASE_URL,
+whose tables are dropped and recreated:
+
+    export BENCHMARK_DATABASE_URL=postgresql://postgres@localhost:5432/trivia_benchmark
+    python benchmark_json.py 10000
+'''
+import json
+import sys
+import time
+from os import environ as env
+from flask import Flask, jsonify
+
+import fast_json
+from fast_json import json_response, project
+from flaskr import QUESTION_COLUMNS, QUESTIONS_PER_PAGE
+from models import db, setup_db, Question, Category
+
+BENCHMARK_DATABASE_URL = env["BENCHMARK_DATABASE_URL"]
+
+# endpoint: the page of questions it returns
+ENDPOINTS = {
+    "GET /questions": lambda: Question.query.order_by(Question.id),
+    "GET /categories/1/questions":
+        lambda: Question.query.order_by(Question.id).
+        filter(Question.category == 1),
+    "POST /questions (search)":
+        lambda: Question.query.order_by(Question.id).
+        filter(Question.question.ilike("%title%"))
+}
+
+CATEGORIES = ["Science", "Art", "Geography", "History", "Entertainment",
+              "Sports"]
+RUNS = 200
+SEED_BATCH_SIZE = 10000
+
+
+def seed(rows):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(Category.__table__.insert(),
+                       [{"type": category} for category in CATEGORIES])
+    for start in range(0, rows, SEED_BATCH_SIZE):
+        db.session.execute(Question.__table__.insert(), [
+            {"question": f"what is the title of question {i}?",
+             "answer": f"question {i}",
+             "category": i % len(CATEGORIES) + 1,
+             "difficulty": i % 5 + 1}
+            for i in range(start, min(start + SEED_BATCH_SIZE, rows))])
+    db.session.commit()
+
+
+def with_jsonify(query):
+    questions = [question.format()
+                 for question in query.limit(QUESTIONS_PER_PAGE)]
+    return jsonify({"success": True, "questions": questions})
+
+
+def with_fast_json(query):
+    questions = project(query.limit(QUESTIONS_PER_PAGE), QUESTION_COLUMNS)
+    return json_response({"success": True, "questions": questions})
+
+
+def measure(endpoint, respond):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        body = respond(ENDPOINTS[endpoint]()).get_data()
+        # objects loaded for format() would otherwise stay in the session
+        db.session.expunge_all()
+    return body, (time.perf_counter() - start) / RUNS
+
+
+def main():
+    # only the database is needed, create_app() would also connect to the
+    # one in DB_NAME
+    app = Flask(__name__)
+    setup_db(app, BENCHMARK_DATABASE_URL)
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    with app.app_context():
+        seed(rows)
+
+    encoder = "orjson" if fast_json.orjson is not None else "json"
+    print(f"{rows} questions, pages of {QUESTIONS_PER_PAGE}, "
+          f"fast_json with {encoder}")
+
+    for endpoint in ENDPOINTS:
+        with app.test_request_context():
+            old_body, old_seconds = measure(endpoint, with_jsonify)
+            new_body, new_seconds = measure(endpoint, with_fast_json)
+
+        if json.loads(old_body) != json.loads(new_body):
+            sys.exit(f"{endpoint}: the two bodies differ")
+
+        print(f"{endpoint:<28} jsonify {old_seconds * 1000:7.3f} ms  "
+              f"fast_json {new_seconds * 1000:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
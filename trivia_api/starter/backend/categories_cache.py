@@ -0,0 +1,69 @@
+'''
+Process-local cache of the {id: type} categories map and the /categories
+body. It is rebuilt on the next read after this process commits a change
+to a Category row; edits made outside the app show up after a restart.
+'''
+import hashlib
+import json
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import Category
+
+
+class CategoriesEntry:
+    def __init__(self, version, categories):
+        self.version = version
+        # {id: type}, in id order
+        self.categories = categories
+        self.body = json.dumps({
+            "categories": categories,
+            "success": True,
+            "total_categories": len(categories)
+            }, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+
+class CategoriesCache:
+    def __init__(self):
+        self.version = 0
+        self.entry = None
+        self.lock = threading.Lock()
+
+        event.listen(Session, 'after_flush', self.track_changes)
+        event.listen(Session, 'after_commit', self.invalidate)
+        event.listen(Session, 'after_rollback', self.forget_changes)
+
+    def track_changes(self, session, flush_context):
+        changed = session.new | session.dirty | session.deleted
+        if any(isinstance(obj, Category) for obj in changed):
+            session.info['categories_changed'] = True
+
+    def forget_changes(self, session):
+        session.info.pop('categories_changed', None)
+
+    def invalidate(self, session):
+        if session.info.pop('categories_changed', False):
+            self.version += 1
+
+    def get(self):
+        '''
+        Returns the CategoriesEntry for the current version, querying the
+        database only if a category changed since it was built
+        '''
+        entry = self.entry
+        if entry is not None and entry.version == self.version:
+            return entry
+
+        with self.lock:
+            # another request may have rebuilt it while this one waited
+            entry = self.entry
+            version = self.version
+            if entry is None or entry.version != version:
+                categories = {category.id: category.type for category in
+                              Category.query.order_by(Category.id).all()}
+                entry = self.entry = CategoriesEntry(version, categories)
+            return entry
+
+
+categories_cache = CategoriesCache()
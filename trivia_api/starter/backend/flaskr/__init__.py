@@ -1,17 +1,38 @@
 import os
-from flask import Flask, request, abort, jsonify
+from flask import Flask, Response, request, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy, Pagination
 from flask_cors import CORS
 import random
 
-from models import setup_db, Question, Category
+from models import db, setup_db, count_rows, random_question, Question, Category
+from query_profiler import QueryProfiler
+from db_pool import PoolMetrics
+from quiz_sessions import QuizSessions, SessionNotFound
+from categories_cache import categories_cache
+from fast_json import json_response, project
 
 QUESTIONS_PER_PAGE = 10
 
+# the columns of Question.format(), read straight from the result rows
+QUESTION_COLUMNS = (Question.id, Question.question, Question.answer,
+                    Question.category, Question.difficulty)
+
+def paginate_questions(request, selection):
+  # default to page 1 if "page" is not a key provided to the request
+  page = max(request.args.get("page", 1, type=int), 1)
+
+  # LIMIT/OFFSET in the database. unlike Query.paginate() this doesn't run a
+  # second count(*) of its own; totals come from count_rows()
+  return project(selection.limit(QUESTIONS_PER_PAGE).\
+    offset((page - 1) * QUESTIONS_PER_PAGE), QUESTION_COLUMNS)
+
 def create_app(test_config=None):
   # create and configure the app
   app = Flask(__name__)
   setup_db(app)
+  QueryProfiler(app)
+  PoolMetrics(app, db)
+  quiz_sessions = QuizSessions(app)
   
   '''
   @TODO: Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
@@ -30,22 +51,16 @@ def create_app(test_config=None):
 
   @app.route("/categories", methods=["GET"])
   def get_categories():
-    categories = Category.query.order_by(Category.id).all()
-    
-    # change the categories to a dictionary of id: type to cooperate with
-    # the front end
-    formatted_categories_dict = {}
-    for category in categories:
-      formatted_categories_dict[category.id] = category.type
-
-    if len(formatted_categories_dict) == 0:
+    # the body is serialized once per change to the categories, and clients
+    # sending back its ETag get a 304 without a body
+    cached = categories_cache.get()
+
+    if len(cached.categories) == 0:
       abort(404)
 
-    return jsonify({
-      "success": True,
-      "categories": formatted_categories_dict,
-      "total_categories": len(formatted_categories_dict)
-      })
+    response = Response(cached.body, mimetype="application/json")
+    response.set_etag(cached.etag)
+    return response.make_conditional(request)
 
   @app.route('/categories/<int:category_id>/questions', methods=["GET"])
   def get_questions_by_category(category_id):
@@ -57,49 +72,33 @@ def create_app(test_config=None):
 
     current_category = current_category.format()
 
-    # default to page 1 if "page" is not a key provided to the request
-    page = request.args.get("page", 1, type=int)
-
-    # user SQLALchemy's pagination method for speed and accuracy
-    questions = Question.query.order_by(Question.id).\
-      filter(Question.category==category_id).\
-      paginate(page, QUESTIONS_PER_PAGE, False)
+    formatted_questions = paginate_questions(request,
+      Question.query.order_by(Question.id).\
+        filter(Question.category==category_id))
 
-    formatted_questions = [question.format() for question in questions.items]
-
-    return jsonify({
+    return json_response({
       "success": True,
       "questions": formatted_questions,
-      "total_questions": len(Question.query.\
-                         filter(Question.category==category_id).all()),
+      "total_questions": count_rows(Question,
+                                    Question.category == category_id),
       "current_category": current_category
       })
 
   @app.route("/questions", methods=["GET"])
   def get_questions():
-    # default to page 1 if "page" is not a key provided to the request
-    page = request.args.get("page", 1, type=int)
+    formatted_questions = paginate_questions(request,
+      Question.query.order_by(Question.id))
 
-    # user SQLALchemy's pagination method for speed and accuracy
-    questions = Question.query.order_by(Question.id).\
-      paginate(page, QUESTIONS_PER_PAGE, False)
-
-    formatted_questions = [question.format() for question in questions.items]
-
-    categories = Category.query.order_by(Category.id).all()
-    # change the categories to a dictionary of id: type to cooperate with
-    # the front end
-    formatted_categories_dict = {}
-    for category in categories:
-      formatted_categories_dict[category.id] = category.type
+    # a dictionary of id: type to cooperate with the front end
+    formatted_categories_dict = categories_cache.get().categories
 
     if len(formatted_questions) == 0:
       abort(404)
 
-    return jsonify({
+    return json_response({
       "success": True,
       "questions": formatted_questions,
-      "total_questions": len(Question.query.all()),
+      "total_questions": count_rows(Question),
       "current_category": None,
       "categories": formatted_categories_dict
       })
@@ -116,15 +115,12 @@ def create_app(test_config=None):
     return jsonify({
       "success": True,
       "deleted": question_id,
-      "total_questions": len(Question.query.all())
+      "total_questions": count_rows(Question)
       })
 
   @app.route("/questions", methods=["POST"])
   def search_create_question():
     body = request.get_json()
-    
-    # default to page 1 if "page" is not a key provided to the request
-    page = request.args.get("page", 1, type=int)
 
     if body is None:
       abort(422)
@@ -135,15 +131,14 @@ def create_app(test_config=None):
 
     if search is not None:
       # search for a question
-      questions = Question.query.filter(Question.question.ilike(
-        f'%{search}%')).paginate(page, QUESTIONS_PER_PAGE, False)
+      search_filter = Question.question.ilike(f'%{search}%')
+      formatted_questions = paginate_questions(request,
+        Question.query.order_by(Question.id).filter(search_filter))
 
-      formatted_questions = [question.format() for question in questions.items]
-
-      return jsonify({
+      return json_response({
         "success": True,
         "questions": formatted_questions,
-        "total_questions": len(formatted_questions)
+        "total_questions": count_rows(Question, search_filter)
         })
 
     else:
@@ -161,16 +156,13 @@ def create_app(test_config=None):
 
       new_question.insert()
 
-      # user SQLALchemy's pagination method for speed and accuracy
-      questions = Question.query.order_by(Question.id).\
-        paginate(page, QUESTIONS_PER_PAGE, False)
-
-      formatted_questions = [question.format() for question in questions.items]
+      formatted_questions = paginate_questions(request,
+        Question.query.order_by(Question.id))
 
-      return jsonify({
+      return json_response({
         "success": True,
         "questions": formatted_questions,
-        "total_questions": len(Question.query.all()),
+        "total_questions": count_rows(Question),
         "current_category": category
         })
 
@@ -186,31 +178,65 @@ def create_app(test_config=None):
     quiz_category = body.get("quiz_category")
     previous_questions = body.get("previous_questions", [])    
 
-    if quiz_category["id"] == 0:
-      questions = Question.query.all()
-    else:
-      questions = Question.query.filter(
-        Question.category == quiz_category["id"]).all()
+    question = random_question(previous_questions, quiz_category["id"])
 
     # set question to None to force an end if there are no questions left
-    if len(questions) == len(previous_questions):
+    if question is None:
      return jsonify({
         "success": True,
         "question": None
         })
 
-    # get random question
-    while True:
-      question = random.choice(questions)
-      if question.id not in previous_questions:
-        break
-
-
     return jsonify({
     "success": True,
     "question": question.format()
     })
 
+  @app.route('/quizzes/sessions', methods=["POST"])
+  def start_quiz_session():
+    body = request.get_json(silent=True)
+
+    if not isinstance(body, dict) or 'quiz_category' not in body.keys():
+      abort(422)
+
+    quiz_category = body.get("quiz_category")
+
+    # the category id is 0 for every category
+    if not isinstance(quiz_category, dict) \
+    or type(quiz_category.get("id")) not in (int, str):
+      abort(400)
+
+    # the deck is built once here, every following step only pops an id
+    selection = Question.query.with_entities(Question.id)
+    if quiz_category["id"] != 0:
+      selection = selection.filter(Question.category == quiz_category["id"])
+
+    question_ids = [question.id for question in selection]
+
+    return jsonify({
+      "success": True,
+      "session_id": quiz_sessions.start(question_ids),
+      "total_questions": len(question_ids)
+      })
+
+  @app.route('/quizzes/sessions/<session_id>/next', methods=["POST"])
+  def next_quiz_question(session_id):
+    try:
+      # skip questions deleted since the session started
+      question = None
+      while question is None:
+        question_id = quiz_sessions.next(session_id)
+        if question_id is None:
+          break
+        question = Question.query.get(question_id)
+    except SessionNotFound:
+      abort(404)
+
+    return jsonify({
+      "success": True,
+      "question": question.format() if question is not None else None
+      })
+
   ################
   # error handlers
   ################
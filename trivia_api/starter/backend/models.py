@@ -1,9 +1,11 @@
 import os
 from os import environ as env
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, Index, create_engine, func, text
 from flask_sqlalchemy import SQLAlchemy
 import json
+import random
 from dotenv import load_dotenv, dotenv_values
+from db_pool import engine_options_from_env
 
 load_dotenv()
 user = env["DB_USER"]
@@ -24,16 +26,62 @@ setup_db(app)
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options_from_env(database_path)
     db.app = app
     db.init_app(app)
     db.create_all()
 
+'''
+count_rows(model, *criterion)
+    returns the number of rows of model matching criterion with a
+    SELECT count(*) instead of loading every row. unfiltered counts of large
+    PostgreSQL tables come from the planner's estimate in pg_class, which is
+    kept current by autovacuum/ANALYZE, rather than a full table scan
+'''
+APPROXIMATE_COUNT_THRESHOLD = 100000
+
+def count_rows(model, *criterion):
+    if not criterion and db.engine.dialect.name == 'postgresql':
+        estimate = db.session.execute(
+            text("SELECT reltuples::bigint FROM pg_class "
+                 "WHERE oid = CAST(:table_name AS regclass)"),
+            {"table_name": model.__tablename__}).scalar()
+        if estimate is not None and estimate >= APPROXIMATE_COUNT_THRESHOLD:
+            return estimate
+
+    return db.session.query(func.count(model.id)).filter(*criterion).scalar()
+
+'''
+random_question(previous_questions, category_id=0)
+    returns a random question whose id isn't in previous_questions, from
+    category_id or from every category when it is 0, or None when every
+    question has been played. the unseen questions are counted and one is
+    picked by a random offset into them in id order, so every unseen
+    question is equally likely. both queries walk the (category, id) index
+'''
+def random_question(previous_questions, category_id=0):
+    criteria = []
+    if previous_questions:
+        criteria.append(Question.id.notin_(previous_questions))
+    if category_id:
+        criteria.append(Question.category == category_id)
+
+    unseen = db.session.query(func.count(Question.id)).\
+        filter(*criteria).scalar()
+    if unseen == 0:
+        return None
+
+    return Question.query.filter(*criteria).order_by(Question.id).\
+        offset(random.randrange(unseen)).limit(1).first()
+
 '''
 Question
 
 '''
 class Question(db.Model):  
   __tablename__ = 'questions'
+  # lets random_question() seek by id within a category
+  __table_args__ = (Index('ix_questions_category', 'category', 'id'),)
 
   id = Column(Integer, primary_key=True)
   question = Column(String)
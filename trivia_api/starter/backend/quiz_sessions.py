@@ -0,0 +1,156 @@
+'''
+Server-side quiz sessions
+
+Starting a quiz shuffles the ids of every question in the chosen category
+once and keeps them, as a compact array, in a session store. Each step of
+the quiz then pops the next id off the deck, so the client only sends the
+session id and the server never re-filters the questions already played.
+
+    quiz_sessions = QuizSessions(app)
+    session_id = quiz_sessions.start(question_ids)
+    question_id = quiz_sessions.next(session_id)
+
+Sessions live in a MemoryStore by default, which only works while the app
+runs in a single process. To share sessions between workers, pass
+store=RedisStore(client, ttl) or set it on app.extensions['quiz_sessions']
+before the first request.
+
+app.config options
+    QUIZ_SESSION_TTL        seconds a session is kept after it was last
+                            used (default 3600)
+    QUIZ_SESSION_MAX        most sessions a MemoryStore keeps before the
+                            least recently used one is dropped (default 10000)
+'''
+import random
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+
+# signed 64 bit, wide enough for any Integer primary key
+ID_TYPECODE = 'q'
+
+
+class SessionNotFound(KeyError):
+    pass
+
+
+class MemoryStore:
+    '''
+    Decks kept in this process, least recently used first. Sessions expire
+    ttl seconds after they were last used, and the least recently used one
+    is dropped once there are more than max_sessions
+    '''
+
+    def __init__(self, ttl, max_sessions):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        # session id -> (expires at, deck). the deck is popped from the end
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def create(self, session_id, deck):
+        with self.lock:
+            self._expire(time.monotonic())
+            self.sessions[session_id] = (time.monotonic() + self.ttl, deck)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+    def pop(self, session_id):
+        '''
+        Returns the next question id of the session, or None once the deck
+        is empty. Raises SessionNotFound for unknown or expired sessions
+        '''
+        now = time.monotonic()
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is None or entry[0] <= now:
+                self.sessions.pop(session_id, None)
+                raise SessionNotFound(session_id)
+
+            deck = entry[1]
+            self.sessions[session_id] = (now + self.ttl, deck)
+            self.sessions.move_to_end(session_id)
+            return deck.pop() if deck else None
+
+    def _expire(self, now):
+        # every session is refreshed when used, so the least recently used
+        # ones are also the first to expire
+        while self.sessions:
+            session_id, (expires_at, deck) = next(iter(self.sessions.items()))
+            if expires_at > now:
+                break
+            del self.sessions[session_id]
+
+
+class RedisStore:
+    '''
+    Decks kept in Redis lists, for apps running in more than one process.
+    client is a redis.Redis connection or anything with the same rpush,
+    lpop, set and expire methods
+    '''
+
+    def __init__(self, client, ttl, prefix='quiz:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _keys(self, session_id):
+        # redis deletes a list once it is empty, so a second key records that
+        # the session exists after its last question has been popped
+        return (f'{self.prefix}{session_id}:deck',
+                f'{self.prefix}{session_id}:started')
+
+    def create(self, session_id, deck):
+        deck_key, started_key = self._keys(session_id)
+        self.client.set(started_key, 1, ex=self.ttl)
+        if deck:
+            # reversed so lpop hands out ids in the same order as
+            # MemoryStore, which pops from the end of the deck
+            self.client.rpush(deck_key, *reversed(deck))
+            self.client.expire(deck_key, self.ttl)
+
+    def pop(self, session_id):
+        deck_key, started_key = self._keys(session_id)
+        if not self.client.expire(started_key, self.ttl):
+            raise SessionNotFound(session_id)
+
+        question_id = self.client.lpop(deck_key)
+        if question_id is None:
+            return None
+        self.client.expire(deck_key, self.ttl)
+        return int(question_id)
+
+
+class QuizSessions:
+    def __init__(self, app=None, store=None):
+        self.store = store
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('QUIZ_SESSION_TTL', 3600)
+        app.config.setdefault('QUIZ_SESSION_MAX', 10000)
+
+        if self.store is None:
+            self.store = MemoryStore(app.config['QUIZ_SESSION_TTL'],
+                                     app.config['QUIZ_SESSION_MAX'])
+        app.extensions['quiz_sessions'] = self
+
+    def start(self, question_ids):
+        '''
+        Shuffles question_ids into a new deck and returns its session id
+        '''
+        deck = array(ID_TYPECODE, question_ids)
+        random.shuffle(deck)
+
+        session_id = uuid.uuid4().hex
+        self.store.create(session_id, deck)
+        return session_id
+
+    def next(self, session_id):
+        '''
+        Returns the next question id, or None when the deck is used up
+        '''
+        return self.store.pop(session_id)
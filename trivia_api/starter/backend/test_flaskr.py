@@ -3,10 +3,13 @@ from os import environ as env
 from dotenv import load_dotenv, dotenv_values
 import unittest
 import json
+from array import array
 from flask_sqlalchemy import SQLAlchemy
 
 from flaskr import create_app
-from models import setup_db, Question, Category
+from models import db, setup_db, Question, Category
+from categories_cache import categories_cache
+from quiz_sessions import MemoryStore, RedisStore, SessionNotFound
 
 load_dotenv()
 
@@ -53,6 +56,71 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data["categories"])
         self.assertTrue(data["total_categories"])
 
+    def test_get_categories_after_insert(self):
+        self.client().get('/categories')
+        category = Category(type="Music")
+        db.session.add(category)
+        db.session.flush()
+        # flushed but not committed, the cached categories stay current
+        self.assertNotIn("Music", categories_cache.get().categories.values())
+
+        db.session.commit()
+        response = self.client().get('/categories')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Music", data["categories"].values())
+
+        db.session.delete(category)
+        db.session.commit()
+        response = self.client().get('/categories')
+        data = json.loads(response.data)
+
+        self.assertNotIn("Music", data["categories"].values())
+
+    def test_get_categories_server_timing(self):
+        response = self.client().get('/categories')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("db;dur=", response.headers["Server-Timing"])
+
+    def test_get_categories_not_modified(self):
+        response = self.client().get('/categories')
+        etag = response.headers["ETag"]
+
+        response = self.client().get('/categories',
+            headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+
+    def test_500_over_query_budget(self):
+        self.app.config["QUERY_BUDGET"] = 0
+        self.app.config["QUERY_BUDGET_RAISE"] = True
+        response = self.client().get('/questions')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(data["success"], False)
+
+    def test_get_pool_metrics(self):
+        self.app.config["POOL_METRICS_ENABLED"] = True
+        self.client().get('/questions')
+        response = self.client().get('/metrics')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertTrue(data["database_pool"]["checkouts"])
+
+    def test_404_pool_metrics_disabled(self):
+        self.app.config["POOL_METRICS_ENABLED"] = False
+        response = self.client().get('/metrics')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data["success"], False)
+
     def test_404_sent_request_to_invalid_page(self):
         response = self.client().get('/categories/1')
         data = json.loads(response.data)
@@ -205,6 +273,29 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data["success"], True)
         self.assertTrue(data["question"])
 
+    def test_play_quiz_all_questions_played(self):
+        played = [question.id for question in Question.query.all()]
+        response = self.client().post('/quizzes', json={"quiz_category": {"id": 0},
+            "previous_questions": played})
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(data["question"], None)
+
+    def test_play_quiz_picks_any_unseen_question(self):
+        # the first and last questions are the only ones left, each should
+        # come up about half the time
+        ids = sorted(question.id for question in Question.query.all())
+        unseen = {ids[0], ids[-1]}
+        picked = set()
+        for _ in range(50):
+            response = self.client().post('/quizzes', json={"quiz_category": {"id": 0},
+                "previous_questions": ids[1:-1]})
+            picked.add(json.loads(response.data)["question"]["id"])
+
+        self.assertEqual(picked, unseen)
+
     def test_422_no_category(self):
         response = self.client().post('/quizzes', json={"previous_questions": []})
         data = json.loads(response.data)
@@ -221,6 +312,144 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "cannot process")
 
+    # test the /quizzes/sessions endpoints
+    def test_start_quiz_session(self):
+        response = self.client().post('/quizzes/sessions',
+            json={"quiz_category": {"id": 0}})
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertTrue(data["session_id"])
+        self.assertTrue(data["total_questions"])
+
+    def test_next_quiz_session_question(self):
+        response = self.client().post('/quizzes/sessions',
+            json={"quiz_category": {"id": 3}})
+        session = json.loads(response.data)
+
+        played = []
+        for i in range(session["total_questions"]):
+            response = self.client().post('/quizzes/sessions/{}/next'.format(
+                session["session_id"]))
+            data = json.loads(response.data)
+            played.append(data["question"]["id"])
+
+        response = self.client().post('/quizzes/sessions/{}/next'.format(
+            session["session_id"]))
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(data["question"], None)
+        self.assertEqual(len(played), len(set(played)))
+
+    def test_404_unknown_quiz_session(self):
+        response = self.client().post('/quizzes/sessions/unknown/next')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data["success"], False)
+
+    def test_422_quiz_session_no_category(self):
+        response = self.client().post('/quizzes/sessions', json={})
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "cannot process")
+
+    def test_400_quiz_session_category_without_id(self):
+        response = self.client().post('/quizzes/sessions',
+            json={"quiz_category": {"type": "Science"}})
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data["success"], False)
+
+
+class FakeRedis:
+    """The rpush, lpop, set and expire calls RedisStore makes, in memory"""
+
+    def __init__(self):
+        self.values = {}
+        self.expiries = {}
+
+    def set(self, key, value, ex=None):
+        self.values[key] = str(value).encode()
+        self.expiries[key] = ex
+
+    def rpush(self, key, *values):
+        self.values.setdefault(key, []).extend(
+            str(value).encode() for value in values)
+
+    def lpop(self, key):
+        values = self.values.get(key)
+        if not values:
+            return None
+        value = values.pop(0)
+        # redis deletes emptied lists
+        if not values:
+            del self.values[key]
+        return value
+
+    def expire(self, key, seconds):
+        if key not in self.values:
+            return False
+        self.expiries[key] = seconds
+        return True
+
+
+class QuizSessionStoreTestCase(unittest.TestCase):
+    """Session stores on their own, without the app or a database"""
+
+    def test_memory_store_pops_deck_then_none(self):
+        store = MemoryStore(ttl=60, max_sessions=10)
+        store.create("a", array('q', [1, 2, 3]))
+
+        self.assertEqual([store.pop("a") for _ in range(4)], [3, 2, 1, None])
+
+    def test_memory_store_expires_sessions(self):
+        store = MemoryStore(ttl=0, max_sessions=10)
+        store.create("a", array('q', [1]))
+
+        with self.assertRaises(SessionNotFound):
+            store.pop("a")
+        self.assertEqual(len(store.sessions), 0)
+
+    def test_memory_store_drops_least_recently_used(self):
+        store = MemoryStore(ttl=60, max_sessions=2)
+        store.create("a", array('q', [1, 2]))
+        store.create("b", array('q', [1, 2]))
+        # using a makes b the least recently used
+        store.pop("a")
+        store.create("c", array('q', [1, 2]))
+
+        self.assertEqual(list(store.sessions), ["a", "c"])
+        with self.assertRaises(SessionNotFound):
+            store.pop("b")
+
+    def test_redis_store_pops_like_memory_store(self):
+        client = FakeRedis()
+        store = RedisStore(client, ttl=60)
+        store.create("a", array('q', [1, 2, 3]))
+
+        self.assertEqual([store.pop("a") for _ in range(4)], [3, 2, 1, None])
+        self.assertEqual(client.expiries["quiz:a:started"], 60)
+
+    def test_redis_store_unknown_or_expired_session(self):
+        client = FakeRedis()
+        store = RedisStore(client, ttl=60)
+        store.create("a", array('q', [1]))
+        # what redis does once the ttl has passed
+        client.values.clear()
+
+        with self.assertRaises(SessionNotFound):
+            store.pop("a")
+        with self.assertRaises(SessionNotFound):
+            store.pop("unknown")
+
+
 # Make the tests conveniently executable
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file